@@ -1,17 +1,18 @@
 #!/usr/bin/env python3
 
 """
-A script to launch the app (or serve as an entry point, whatever)
+A script to launch the engine, speaking UCI on stdin / stdout (the same as
+the magnanimus console script, or python -m magnanimus)
 """
 
-# NB this import does not work until my_package has been installed, and is
+# NB this import does not work until magnanimus has been installed, and is
 # available in the PYTHONPATH
-from my_package import main
+from magnanimus.uci import main
 
 def launch():
-    main.main()
+    return main()
 
 
 # setup.py will by default enter at launch() but to run this script:
 if __name__ == "__main__":
-    launch()    
+    raise SystemExit(launch())
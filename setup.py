@@ -35,10 +35,10 @@ setup(
     # Standard is to use a __main__.py module which allows
     # $ python -m my_package
 
-    # entry_points = {
-    # 'console_scripts': [
-    #     f'{PACKAGE_NAME}-cli = {PACKAGE_NAME}.__main__:main',
-    # ]},
+    entry_points = {
+    'console_scripts': [
+        f'{PACKAGE_NAME} = {PACKAGE_NAME}.uci:main',
+    ]},
 
     # alternative to entry_points, this makes the script available
     # in cli (need to give full file name, and alias elsewhere if reqd)
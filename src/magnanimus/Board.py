@@ -0,0 +1,290 @@
+"""
+Compact board used by Position and the analysis functions, in place of
+the pandas df (which is now only built on demand, for display).
+
+    squares:  64-entry int8 array of piece codes (PIECE_INTS), positive
+              for white, negative for black, 0 for empty
+    pieces:   per-color lists of occupied squares
+    analysis: per-square tuples as returned by analyse_piece
+              (free, just_covering, attacking, defending, gives_check, score)
+              plus touch and hit masks (see set_analysis), or None for
+              empty / unanalysed squares
+    masks:    64-bit occupancy masks by piece code (indexed code + 6), for
+              the bitboard backend
+    occ:      64-bit occupancy masks by color
+
+Each piece's analysis also carries two masks (see set_analysis):
+    touch:  squares in any of its four lists, and for a pawn all its
+            ahead squares (a blocked one is in no list) - when one of
+            these changes the piece needs reanalysing
+    hit:    squares it attacks, defends or covers (for a pawn its
+            diagonals, for others free, attacking and defending squares)
+Finding the pieces touching a square is then one AND per piece, rather
+than searching each piece's lists, and attack / check queries are an OR
+of the color's hit masks.
+"""
+from array import array
+
+from .constants import (PIECE_INTS, REV_PIECE_INTS, COLOR_SIGNS,
+                        INIT_BOARD_TUPLES)
+from .utils import piece_tuples_from_str
+from .bitboards import PAWN_AHEAD, mask_of
+
+ANALYSIS_FIELDS = ['free', 'just_covering', 'attacking', 'defending',
+                   'gives_check', 'score']
+
+BITS = [1 << square for square in range(64)]
+
+# by pawn code, then square
+PAWN_AHEAD_MASKS = {
+    PIECE_INTS['pawn'] * COLOR_SIGNS[color]: [mask_of(squares)
+                                              for squares in PAWN_AHEAD[color]]
+    for color in ['white', 'black']
+}
+
+
+class Board():
+    """
+    Holds the pieces and their analysis.  Cheap to copy: the arrays are
+    copied, the per-square analysis tuples are shared (they are replaced,
+    never mutated).
+    """
+    __slots__ = ['squares', 'pieces', 'analysis', 'masks', 'occ']
+
+    def __init__(self, squares=None, pieces=None, analysis=None,
+                 masks=None, occ=None):
+        self.squares = squares if squares is not None else array('b', bytes(64))
+        self.pieces = pieces or {'white': [], 'black': []}
+        self.analysis = analysis or [None] * 64
+        self.masks = masks or [0] * 13
+        self.occ = occ or {'white': 0, 'black': 0}
+
+    def __contains__(self, square):
+        return self.squares[square] != 0
+
+    def __len__(self):
+        return len(self.pieces['white']) + len(self.pieces['black'])
+
+    def __iter__(self):
+        """
+        Iterate over occupied squares
+        """
+        yield from self.pieces['white']
+        yield from self.pieces['black']
+
+    def copy(self):
+        return Board(array('b', self.squares),
+                     {'white': self.pieces['white'][:],
+                      'black': self.pieces['black'][:]},
+                     self.analysis[:],
+                     self.masks[:],
+                     self.occ.copy())
+
+    def piece(self, square):
+        """
+        Return piece name on square, or None
+        """
+        code = self.squares[square]
+        if not code:
+            return None
+        return REV_PIECE_INTS[abs(code)]
+
+    def color(self, square):
+        """
+        Return color of piece on square, or None
+        """
+        code = self.squares[square]
+        if not code:
+            return None
+        return 'white' if code > 0 else 'black'
+
+    def king_square(self, color):
+        """
+        Return the square of color's king, or None
+        """
+        kings = self.masks[PIECE_INTS['king'] * COLOR_SIGNS[color] + 6]
+        if not kings:
+            return None
+        return kings.bit_length() - 1
+
+    def touching(self, squares_mask):
+        """
+        Return the squares of pieces whose analysis touches any square in
+        squares_mask
+        """
+        analysis = self.analysis
+        return [sq for sq in self if analysis[sq][6] & squares_mask]
+
+    def hit_mask(self, color):
+        """
+        Mask of squares hit by color's pieces (per the current analysis)
+        """
+        analysis = self.analysis
+        out = 0
+        for sq in self.pieces[color]:
+            out |= analysis[sq][7]
+        return out
+
+    def set_analysis(self, square, analysis):
+        """
+        Set the analysis of the piece on square, appending its touch and
+        hit masks
+        """
+        if analysis is not None and len(analysis) == 6:
+            analysis += self.analysis_masks(square, analysis)
+        self.analysis[square] = analysis
+
+    def analysis_masks(self, square, analysis):
+        """
+        Return (touch mask, hit mask) for a piece's analysis
+        """
+        free, just_covering, attacking, defending = analysis[:4]
+        hit = 0
+        for target in attacking:
+            hit |= BITS[target]
+        for target in defending:
+            hit |= BITS[target]
+
+        free_mask = 0
+        for target in free:
+            free_mask |= BITS[target]
+        covering = 0
+        for target in just_covering:
+            covering |= BITS[target]
+
+        touch = free_mask | covering
+        code = self.squares[square]
+        if abs(code) == PIECE_INTS['pawn']:
+            hit |= covering
+            touch |= PAWN_AHEAD_MASKS[code][square]
+        else:
+            hit |= free_mask
+
+        return hit | touch, hit
+
+    def put(self, piece, color, square):
+        code = PIECE_INTS[piece] * COLOR_SIGNS[color]
+        self.squares[square] = code
+        self.pieces[color].append(square)
+        self.masks[code + 6] |= 1 << square
+        self.occ[color] |= 1 << square
+
+    def make_move(self, sq_from, sq_to):
+        """
+        Move the piece on sq_from to sq_to, dropping anything on sq_to.
+        The moved piece keeps its (now stale) analysis, as when the df
+        index was renamed.
+
+        Returns everything unmake_move needs to restore the board exactly:
+            (sq_from, sq_to, captured code, its index in its color's
+             piece list, its analysis)
+        """
+        captured = self.squares[sq_to]
+        code = self.squares[sq_from]
+        bit_from, bit_to = 1 << sq_from, 1 << sq_to
+        captured_index = None
+        captured_analysis = self.analysis[sq_to]
+        moving_analysis = self.analysis[sq_from]
+
+        if captured:
+            captured_color = 'white' if captured > 0 else 'black'
+            captured_pieces = self.pieces[captured_color]
+            captured_index = captured_pieces.index(sq_to)
+            del captured_pieces[captured_index]
+            self.masks[captured + 6] ^= bit_to
+            self.occ[captured_color] ^= bit_to
+
+        color = 'white' if code > 0 else 'black'
+        color_pieces = self.pieces[color]
+        color_pieces[color_pieces.index(sq_from)] = sq_to
+        self.masks[code + 6] ^= bit_from | bit_to
+        self.occ[color] ^= bit_from | bit_to
+
+        undo = sq_from, sq_to, captured, captured_index, captured_analysis
+
+        self.squares[sq_to] = code
+        self.squares[sq_from] = 0
+        self.analysis[sq_to] = moving_analysis
+        self.analysis[sq_from] = None
+
+        return undo
+
+    def unmake_move(self, undo):
+        """
+        Reverse make_move, given what it returned
+        """
+        sq_from, sq_to, captured, captured_index, captured_analysis = undo
+        code = self.squares[sq_to]
+        bit_from, bit_to = 1 << sq_from, 1 << sq_to
+        moving_analysis = self.analysis[sq_to]
+
+        color = 'white' if code > 0 else 'black'
+        color_pieces = self.pieces[color]
+        color_pieces[color_pieces.index(sq_to)] = sq_from
+        self.masks[code + 6] ^= bit_from | bit_to
+        self.occ[color] ^= bit_from | bit_to
+
+        self.squares[sq_from] = code
+        self.squares[sq_to] = captured
+        self.analysis[sq_from] = moving_analysis
+        self.analysis[sq_to] = captured_analysis
+
+        if captured:
+            captured_color = 'white' if captured > 0 else 'black'
+            self.pieces[captured_color].insert(captured_index, sq_to)
+            self.masks[captured + 6] ^= bit_to
+            self.occ[captured_color] ^= bit_to
+
+    def to_tuples(self):
+        """
+        Return (piece, color, square) tuples, ordered by square
+        """
+        return [(self.piece(sq), self.color(sq), sq) for sq in sorted(self)]
+
+    def to_df(self):
+        """
+        Build the old-style board df, for display and debugging
+        """
+        import pandas as pd
+
+        rows = []
+        for piece, color, square in self.to_tuples():
+            analysis = self.analysis[square] or (None,) * 4 + (False, 0.0)
+            rows.append([square, piece, color] + list(analysis[:6]))
+
+        df = pd.DataFrame(rows, columns=['square', 'piece', 'color']
+                                        + ANALYSIS_FIELDS)
+        df = df.set_index('square')
+        df = df[['piece', 'color', 'free', 'attacking', 'just_covering',
+                 'defending', 'gives_check', 'score']]
+        df['piece'] = df['piece'].astype('category')
+        df['color'] = df['color'].astype('category')
+
+        return df
+
+
+def make_board(piece_seed=None):
+    """
+    Make a board (no analysis) from piece tuples, a board string
+    (see utils.piece_tuples_from_str) or a board df
+    """
+    if isinstance(piece_seed, str):
+        piece_tuples = piece_tuples_from_str(piece_seed)
+
+    elif piece_seed is None:
+        piece_tuples = INIT_BOARD_TUPLES
+
+    elif hasattr(piece_seed, 'loc'):
+        # a board df
+        piece_tuples = [(piece_seed.loc[sq, 'piece'],
+                         piece_seed.loc[sq, 'color'], sq)
+                        for sq in piece_seed.index]
+
+    else:
+        piece_tuples = piece_seed
+
+    board = Board()
+    for piece, color, square in piece_tuples:
+        board.put(piece, color, square)
+
+    return board
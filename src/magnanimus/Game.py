@@ -5,17 +5,32 @@ from .print_board import get_board_str
 from .get_best_move import get_best_move
 from .Position import Position, from_json
 from .notation import trad_to_int
+from .transposition import TranspositionTable, SharedTranspositionTable
+from .book import BOOK_PATH, open_book
+from .ponder import Ponderer
 
 class Game():
     """
     Holds a position object with added metadata and methods 
     so it can run a game
+
+    Each move is searched for up to time_sec seconds, as deep as that
+    allows, or to at most max_its plies if given (see get_best_move - the
+    breadth search only stops between plies).  In 'alphabeta' mode the
+    search is split across workers processes if more than one
+
+    While the position is in the opening book at book_path (if there is
+    one - see book.py) its moves are played without searching
+
+    With ponder (and in 'alphabeta' mode), the opponent's reply predicted
+    by the last search is searched while they think (see ponder.py)
     """
     
     def __init__(self, init_seed=None, color_playing='black',
                  pos_fp=None,
                  to_move='white', legal_castlings=None,
-                 time_sec=5, auto_play=True, max_its=2):
+                 time_sec=5, auto_play=True, max_its=None, mode='breadth',
+                 table_mb=16, workers=1, book_path=BOOK_PATH, ponder=True):
 
         LOG.info('init magnanimo')
 
@@ -26,18 +41,29 @@ class Game():
             self.position = Position(init_seed=init_seed,
                              to_move=to_move, legal_castlings=legal_castlings)
 
-        # this will store past positions
-        self.positions = []
-
         # operational parameters
         self.color_playing = color_playing
         self.time_sec = time_sec
         self.paths = []
         self.max_its = max_its
+        self.mode = mode # search mode for get_best_move
+        self.workers = workers
+
+        # kept across moves so each search reuses the last one's work
+        # (in shared memory if there are worker processes to share it)
+        if workers > 1:
+            self.table = SharedTranspositionTable(table_mb)
+        else:
+            self.table = TranspositionTable(table_mb)
+
+        self.book = open_book(book_path)
+
+        self.ponder = ponder and mode == 'alphabeta'
+        self.ponderer = None
 
         # main loop
         if auto_play:
-            self.auto_play(max_its)
+            self.auto_play(self.max_its)
 
     @property
     def score(self):
@@ -80,19 +106,36 @@ class Game():
         """
         Do the next move
         """
-        if self.position.moves:
-            self.position.print_board(hlights=self.position.moves[-1])
+        max_its = max_its or self.max_its
+
+        if self.position.last_move is not None:
+            self.position.print_board(hlights=self.position.last_move)
         else:
             self.position.print_board()
 
         print(f'{self.checked} is checked')
         # get the opponent's move if its their go
         if self.color_playing != self.position.to_move:
+            self.start_pondering(max_its)
             move = get_opponent_move(self.position)
+            self.stop_pondering(move)
 
         else:
-            move, self.paths = get_best_move(self.position, return_positions=True,
-                                             max_its=max_its)
+            move = self.book.move(self.position) if self.book else None
+
+            if move is not None:
+                LOG.info(f'book move {move}')
+                self.stop_pondering()
+            elif self.ponderer is not None:
+                move, self.paths = self.finish_pondering()
+            else:
+                move, self.paths = get_best_move(self.position,
+                                                 return_positions=True,
+                                                 max_its=max_its,
+                                                 mode=self.mode,
+                                                 table=self.table,
+                                                 time_sec=self.time_sec,
+                                                 workers=self.workers)
 
         if move == 'x':
             return 'x'
@@ -102,13 +145,63 @@ class Game():
 
         print(f'{self.position.to_move} move:', move)
 
-        # update board and turn
-        self.positions.append(self.position)
-        self.position = Position(self.position, new_move=move)
+        # update board and turn (position.moves keeps the history)
+        self.position.push(move)
 
         return 'ok'
 
 
+    def start_pondering(self, max_its=None):
+        """
+        Search the opponent's predicted reply (the next move of the last
+        search's principal variation, if it got that far) in the
+        background, or if none the position itself
+        """
+        if not self.ponder:
+            return
+
+        moves = self.position.moves
+        ply = len(moves)
+        predicted = None
+        if self.paths:
+            pv_moves = self.paths[0].moves
+            # paths may be from before a book move
+            if len(pv_moves) > ply and pv_moves[:ply] == moves:
+                predicted = pv_moves[ply]
+
+        self.ponderer = Ponderer(self.position, predicted, self.table,
+                                 max_its).start()
+
+    def stop_pondering(self, move=None):
+        """
+        Stop pondering and discard it - unless move is the predicted one,
+        when the search carries on as ours (not if searching with worker
+        processes, which would search deeper)
+        """
+        if self.ponderer is None:
+            return
+        if self.workers == 1 and self.ponderer.is_hit(move):
+            return
+        self.ponderer.stop()
+        self.ponderer = None
+
+    def finish_pondering(self):
+        """
+        Return the move and paths from pondering on the move just played,
+        as get_best_move does
+        """
+        score, pv, completed = self.ponderer.finish(self.time_sec)
+        self.ponderer = None
+
+        if not pv:
+            return 'checkmate', None
+
+        pv_position = self.position
+        for move in pv:
+            pv_position = Position(prev_posn=pv_position, new_move=move)
+        return pv[0], [pv_position]
+
+
     def auto_play(self, max_its):
         while True:
             status = self.next(max_its)
@@ -122,7 +215,8 @@ class Game():
         """
         Revert to previous position
         """
-        self.position = self.positions[-1]
+        self.stop_pondering()
+        self.position.pop()
 
 
     # @property
@@ -164,7 +258,7 @@ def get_opponent_move(position):
             else:
                 move = trad_to_int(raw_move)
 
-            if move in position.next_moves:
+            if move in position.legal_moves():
                 return move
 
             position.print_board(hlights=move)
@@ -1,17 +1,33 @@
 
-import numpy as np
 import json
-from copy import deepcopy
+from copy import copy, deepcopy
 
-from .utils import invert_color, make_board_df
+from .utils import invert_color
+from .Board import make_board
+from .bitboards import king_lines, is_attacked
 from .analyse import analyse_board
-from .scoring import CASTLE_SCORE, CHECKMATE_SCORE
-from .constants import INIT_BOARD_TUPLES, CASTLING_ROOK_MOVES
+from .scoring import CASTLE_SCORE, CHECKMATE_SCORE, STALEMATE_SCORE
+from .constants import (INIT_BOARD_TUPLES, CASTLING_ROOK_MOVES,
+                        CASTLING_SQUARES, PIECE_INTS, COLOR_SIGNS)
 from .notation import trad_to_int, int_to_trad
+from .zobrist import (position_key, castling_key, move_key,
+                      BLACK_TO_MOVE_KEY)
 from .print_board import print_board
 
 
 
+class MoveNode():
+    """
+    One move of a position's history, linked to the node before it.
+    Never changed once made, so positions share their common history
+    """
+    __slots__ = ['parent', 'move']
+
+    def __init__(self, parent, move):
+        self.parent = parent
+        self.move = move
+
+
 class Position():
     """
     Holds board and associated info and methods
@@ -21,58 +37,62 @@ class Position():
     Allow history to be accessed
     Does all the Game stuff like update board etc
 
+    History is a MoveNode for the last move (linked back to the first),
+    after root_moves (any prev_moves the position was made with), so a
+    child costs one node rather than a copy of its parent's moves.  moves
+    rebuilds the list when asked.
+
+    checked, score, next_moves and legal_moves() are computed at most once
+    per position, and kept in cache (see cached).  Making a move empties
+    it, pop puts back the one from before the move, and setting mated
+    empties it (score and the moves depend on it).
+
     methods:
         update?  or just do this with init
         explore moves and scores for debug
         explain last move?
     """
+    __slots__ = ['board', 'to_move', 'legal_castlings', 'key', '_mated',
+                 'just_castled', 'undo_stack', 'history', 'root_moves',
+                 'cache']
+
     def __init__(self, prev_posn=None, new_move=None,
                  init_seed=None, init_df=None,
                  prev_moves=None, to_move=None, legal_castlings=None):
         """
-        Either init from scratch with df and moves, or update one passed
+        Either init from scratch with a seed (or df) and moves, or update
+        one passed
         prev_moves is for record, not currently for replaying or anything
         """
 
+        self.undo_stack = []
+        self.cache = {}
+        self._mated = None
         self.just_castled = False
+
         # if updating an existing path with a move
         if prev_posn is not None:
-            # work out if castling move and do some prep
-            # NB don't need to check if legal, done in get_pos_next_moves
-
-            if (prev_posn.legal_castlings[prev_posn.to_move]
-                and new_move[0] >= 100):
-                    # make the king move, adjust the castling state
-                    df, self.legal_castlings = castling_prep(prev_posn,
-                                                             new_move)
-                    # adjust the move to be just the rook one
-                    new_move = new_move[0] - 100, new_move[1]
-                    self.just_castled = True
-            else:
-                df = prev_posn.df.copy()
-                self.legal_castlings = prev_posn.legal_castlings
-
-            self.df = update_df(df, new_move) # doesn't make another copy
-            self.to_move = invert_color(prev_posn.to_move)
-
-            if self.just_castled:
-                self.moves = prev_posn.moves + [(new_move[0] + 100, new_move[1])]
-            else:
-                self.moves = prev_posn.moves + [new_move]
+            # copy the parent then make the move in place
+            self.board = prev_posn.board.copy()
+            self.to_move = prev_posn.to_move
+            self.legal_castlings = prev_posn.legal_castlings
+            self.key = prev_posn.key
+            self.history = prev_posn.history
+            self.root_moves = prev_posn.root_moves
 
-            self._score = 0
-            
+            self.make_move(new_move)
 
         # if init a new path
         else:
-            self.moves = prev_moves or []
+            self.history = None
+            self.root_moves = prev_moves or []
             # if theres an init_df use it, else tuples (new game by default)
             if init_df is not None:
-                self.df = init_df
+                self.board = make_board(init_df)
             else:
                 if init_seed is None:
                     init_seed = INIT_BOARD_TUPLES
-                self.df = make_board_df(init_seed)
+                self.board = make_board(init_seed)
 
             if to_move is None:
                 print('Setting to_move as white')
@@ -80,7 +100,7 @@ class Position():
             else:
                 self.to_move = to_move
 
-            self.df = analyse_board(self.df)
+            self.board = analyse_board(self.board)
 
             if legal_castlings is not None:
                 self.legal_castlings = {'white': [], 'black': []}
@@ -92,16 +112,120 @@ class Position():
                     for color in ['white', 'black']
                 }
 
-            
-        # TODO this
-        self.mated = None
+            self.key = position_key(self.board, self.to_move,
+                                    self.legal_castlings)
+
+
+    def make_move(self, move):
+        """
+        Make the move in place (no legality check - get_pos_next_moves
+        does that), and return what pop needs to restore the position
+        """
+        undo = (move, self.legal_castlings, self.key, self.just_castled,
+                self._mated, self.cache, [])
+        board_undo = undo[-1]
+
+        key = self.key ^ BLACK_TO_MOVE_KEY
+        self.just_castled = False
+
+        # work out if castling move and do some prep
+        if self.legal_castlings[self.to_move] and move[0] >= 100:
+            # make the king move, adjust the castling state
+            king_move, legal_castlings, key = castling_prep(self, move, key)
+            # reanalyse around the king's squares too (the king itself is
+            # picked up with the rook move, which lands next to it)
+            update_df(self.board, king_move, undo=board_undo)
+            self.legal_castlings = legal_castlings
+            # adjust the move to be just the rook one
+            move = move[0] - 100, move[1]
+            self.just_castled = True
+
+        # update the key before the board, while the pieces are known
+        self.key = key ^ move_key(self.board.squares[move[0]], *move,
+                                  captured=self.board.squares[move[1]])
+
+        update_df(self.board, move, undo=board_undo)
+
+        self.to_move = invert_color(self.to_move)
+        self.history = MoveNode(self.history, undo[0])
+        self._mated = None
+        self.cache = {}
+
+        return undo
 
+    def push(self, move):
+        """
+        Make the move in place, keeping what is needed to pop it
+        """
+        self.undo_stack.append(self.make_move(move))
+
+    def pop(self):
+        """
+        Take back the last pushed move, restoring the position exactly.
+        Returns the move
+        """
+        (move, self.legal_castlings, self.key, self.just_castled,
+         self._mated, self.cache, board_undo) = self.undo_stack.pop()
+
+        # reanalysed squares first, then the moves, in reverse
+        for board_move_undo, analysis_undo in reversed(board_undo):
+            for square, analysis in analysis_undo:
+                self.board.set_analysis(square, analysis)
+            self.board.unmake_move(board_move_undo)
+
+        self.to_move = invert_color(self.to_move)
+        self.history = self.history.parent
+
+        return move
+
+    def detached(self):
+        """
+        A copy to hand to another thread or process: its own board, no undo
+        stack, and its history flattened (rather than sharing, or pickling,
+        a chain of nodes)
+        """
+        out = copy(self)
+        out.board = self.board.copy()
+        out.root_moves = self.moves
+        out.history = None
+        out.undo_stack = []
+        out.cache = {}
+        return out
+
+    @property
+    def moves(self):
+        """
+        All moves made, as a new list
+        """
+        out = []
+        node = self.history
+        while node is not None:
+            out.append(node.move)
+            node = node.parent
+        out.reverse()
+        return self.root_moves + out
+
+    @property
+    def last_move(self):
+        if self.history is not None:
+            return self.history.move
+        if self.root_moves:
+            return self.root_moves[-1]
+        return None
+
+    @property
+    def df(self):
+        """
+        The board as a df - built on demand, for display only
+        """
+        return self.board.to_df()
 
     def __repr__(self):
         pad = 15
         out = []
-        if self.moves:
-            out.append('\nMOVES: '.ljust(pad) + f'{self.moves}'.rjust(pad))
+        moves = self.moves
+        if moves:
+            out.append('\nMOVES: '.ljust(pad) + f'{moves}'.rjust(pad))
         out.append('')
         df_strs = str(self.df).split('\n')
         out.extend(['sq' + df_strs[0][2:]] + df_strs[2:])
@@ -118,13 +242,43 @@ class Position():
 
         return "\n".join(out)
 
+    @property
+    def mated(self):
+        """
+        None, or the color mated, or 'stalemate'
+        """
+        return self._mated
+
+    @mated.setter
+    def mated(self, value):
+        self._mated = value
+        self.cache = {}
+
+    def cached(self, name, compute):
+        """
+        Return cache[name], calling compute to fill it if need be
+        """
+        counters = CACHE_COUNTERS[name]
+        try:
+            value = self.cache[name]
+        except KeyError:
+            counters['misses'] += 1
+            value = self.cache[name] = compute()
+        else:
+            counters['hits'] += 1
+        return value
+
     @property
     def checked(self):
         """
         Return black, white or None
         """
-        if is_checked(self.df) is not None:
-            return is_checked(self.df)[0]
+        return self.cached('checked', self.get_checked)
+
+    def get_checked(self):
+        checks = is_checked(self.board)
+        if checks is not None:
+            return checks[0]
         else:
             return None
 
@@ -133,7 +287,13 @@ class Position():
         """
         Remember black pieces are scored negatively already
         """
-        score_from_df = self.df['score'].sum()
+        return self.cached('score', self.get_score)
+
+    def get_score(self):
+        score_from_df = sum(self.board.analysis[sq][5] for sq in self.board)
+
+        if self.mated == 'stalemate':
+            return STALEMATE_SCORE
 
         if self.mated is not None:
             return CHECKMATE_SCORE * (-1 if self.mated == 'black' else 1)
@@ -156,7 +316,24 @@ class Position():
 
     @property
     def next_moves(self):
-        return get_pos_next_moves(self)
+        """
+        Pseudo-legal next moves - the list is cached, so copy it before
+        changing it
+        """
+        # nothing follows a mate / stalemate
+        if self.mated is not None:
+            return None
+        return self.cached('next_moves', lambda: get_pos_next_moves(self))
+
+    def legal_moves(self):
+        """
+        Return the next moves that do not leave the mover in check
+        (None after a mate / stalemate, as next_moves).  Cached as
+        next_moves
+        """
+        if self.mated is not None:
+            return None
+        return self.cached('legal_moves', lambda: get_legal_moves(self))
 
     def print_board(self, next_moves_color=None, hlights=None):
         """
@@ -177,84 +354,114 @@ class Position():
         """
 
         out = {
-            field: self.__dict__[field]
-            for field in ['moves', 'to_move', 'legal_castlings']
+            field: getattr(self, field)
+            for field in ['moves', 'to_move', 'legal_castlings', 'key']
         }
-        out['piece_tuples'] = [
-            (*self.df.loc[sq, ['piece', 'color']].values, sq)
-            for sq in self.df.index
-        ]
+        out['piece_tuples'] = self.board.to_tuples()
 
         with open(fpath, 'w') as fp:
             json.dump(out, fp, indent=4)
 
 
+# hits and misses of Position.cached, across all positions
+CACHE_COUNTERS = {
+    name: {'hits': 0, 'misses': 0}
+    for name in ['checked', 'score', 'next_moves', 'legal_moves']
+}
+
+
+def cache_counters():
+    """
+    Return Position cache hits, misses and hit rate by attribute
+    """
+    return {
+        name: {**counts,
+               'hit_rate': (counts['hits'] / (counts['hits'] + counts['misses'])
+                            if counts['hits'] + counts['misses'] else 0)}
+        for name, counts in CACHE_COUNTERS.items()
+    }
+
+
+def reset_cache_counters():
+    for counts in CACHE_COUNTERS.values():
+        counts['hits'] = counts['misses'] = 0
+
+
 def from_json(fpath):
     with open(fpath, 'r') as fp:
         raw_json = json.load(fp)
 
-    return Position(
+    position = Position(
         init_seed=raw_json['piece_tuples'],
         to_move=raw_json['to_move'],
         prev_moves=raw_json['moves'],
         legal_castlings=raw_json['legal_castlings']
     )
 
+    # key is recomputed, so check it matches (older files may not have one)
+    if raw_json.get('key', position.key) != position.key:
+        raise ValueError(f'{fpath}: saved key does not match position')
 
+    return position
 
-def is_checked(df):
+
+
+def is_checked(board):
     """
     Return list of colors or None
     May be both, in which case is illegal
     """
-    if not any(df['gives_check']):
-        return None
-    
-    checks = df.loc[df['gives_check'], 'color'].unique()
+    checks = [
+        color for color in ['white', 'black']
+        if board.masks[PIECE_INTS['king'] * COLOR_SIGNS[color] + 6]
+        & board.hit_mask(invert_color(color))
+    ]
 
-    # need to invert as the df has color GIVING check
-    return [invert_color(check) for check in checks]
+    return checks or None
 
 
-def update_df(df, move, analyse=True):
+def update_df(board, move, analyse=True, undo=None):
     """
     Pass a move
     Do the move
     Find pieces to change
     Change them
     Get their scores
-    Return the df
+    Return the board (amended in place - name kept from the df days)
+
+    Pass a list as undo to have (board move undo, previous analysis of
+    changed squares) appended, for Position.pop
     """
 
-    # if a piece is getting taken drop it first 
-    if move[1] in df.index:
-        df.drop(move[1], inplace=True)
+    # move the piece, dropping any piece getting taken
+    board_move_undo = board.make_move(*move)
 
-    # move the piece simply by renaming the index
-    df.rename(index={move[0]: move[1]}, inplace=True)
+    squares_to_reanalyse = get_squares_to_reanalyse(board, move)
 
-    squares_to_reanalyse = get_squares_to_reanalyse(df, move)
+    if undo is not None:
+        undo.append((board_move_undo,
+                     [(sq, board.analysis[sq]) for sq in squares_to_reanalyse]))
 
     if analyse:
-        df = analyse_board(df, squares_to_reanalyse)
+        board = analyse_board(board, squares_to_reanalyse)
 
-    return df
+    return board
 
-def get_squares_to_reanalyse(df, move):
+def get_squares_to_reanalyse(board, move):
     """
     get list of squares where either move[0] or move[1] is in
     available
 
     need to include pieces that were defending the moved square
-    """
-    all_sq = df[['free', 'attacking',
-                 'just_covering', 'defending']].sum(axis=1)
-    squares_to_reanalyse = [
-        square for square in df.index
-        if set(all_sq[square]).intersection(move)
-    ]
+    (the touch masks in the board's analysis have all of these)
 
-    return squares_to_reanalyse
+    The moved piece is normally among them, but a castling rook jumps the
+    king so its old domain need not include where it lands
+    """
+    squares = board.touching(1 << move[0] | 1 << move[1])
+    if move[1] not in squares:
+        squares.append(move[1])
+    return squares
 
 
 def get_pos_next_moves(pos, next_moves_color=None):
@@ -266,10 +473,13 @@ def get_pos_next_moves(pos, next_moves_color=None):
     
     next_moves_color = next_moves_color or pos.to_move
 
-    df = pos.df.loc[pos.df['color'] == next_moves_color]
+    analysis = pos.board.analysis
 
-    for square in df.index:
-        for next_square in df.loc[square, ['free', 'attacking']].sum():
+    for square in pos.board.pieces[next_moves_color]:
+        free, _, attacking = analysis[square][:3]
+        for next_square in free:
+            out.append((square, next_square))
+        for next_square in attacking:
             out.append((square, next_square))
             
     if pos.legal_castlings[next_moves_color]:
@@ -280,64 +490,111 @@ def get_pos_next_moves(pos, next_moves_color=None):
     return out
 
 
-def castling_prep(position, move):
+def get_legal_moves(pos):
     """
-    Pre-process the df when the move is castling, by moving the king
-    (so that move / board analysis can proceed as normal using the rook
-     component of the castling move)
+    Filter get_pos_next_moves using the king's checkers, pins and the
+    squares the enemy attacks, so no child position is needed to find
+    moves leaving the mover in check.  Castling is also ruled out out of,
+    through or into check.
+    """
+    moves = pos.next_moves
+    board = pos.board
+    color = pos.to_move
+    king_sq = board.king_square(color)
+
+    # eg test positions with no king
+    if king_sq is None:
+        return moves
+
+    enemy = invert_color(color)
+    checkers, evasions, pinned = king_lines(board, color)
+    double_check = checkers & (checkers - 1)
+    # the king must not stay on a line it blocks itself
+    occ_without_king = (board.occ['white'] | board.occ['black']) ^ 1 << king_sq
 
-    Also return updated castling state
+    out = []
+    for move in moves:
+        sq_from, sq_to = move
+
+        if sq_from >= 100:
+            # castling: king not in check, and does not pass through or land
+            # on an attacked square
+            if checkers:
+                continue
+            step = 1 if sq_from - 100 > king_sq else -1
+            if any(is_attacked(board, king_sq + step * i, enemy)
+                   for i in [1, 2]):
+                continue
+
+        elif sq_from == king_sq:
+            if is_attacked(board, sq_to, enemy, occ_without_king):
+                continue
+
+        elif (double_check
+              or not evasions >> sq_to & 1
+              or (sq_from in pinned and not pinned[sq_from] >> sq_to & 1)):
+            continue
+
+        out.append(move)
+
+    return out
+
+
+def castling_prep(position, move, key):
+    """
+    When the move is castling, work out the king component (so that
+    move / board analysis can proceed as normal using the rook component
+    of the castling move)
+
+    Also return updated castling state, and key updated for the king move
+    and castling state
     """
 
-    df = position.df.copy()
     legal_castlings = deepcopy(position.legal_castlings)
 
     # find out if black or white, k or q
     if move[0] == 100:
-        df.rename(index={4: 2}, inplace=True)
+        king_move = 4, 2
         legal_castlings['black'].remove('q')
     elif move[0] == 107:
-        df.rename(index={4: 6}, inplace=True)
+        king_move = 4, 6
         legal_castlings['black'].remove('k')
     elif move[0] == 156:
-        df.rename(index={60: 58}, inplace=True)
+        king_move = 60, 58
         legal_castlings['white'].remove('q')
     elif move[0] == 163:
-        df.rename(index={60: 62}, inplace=True)
+        king_move = 60, 62
         legal_castlings['white'].remove('k')
 
-    return df, legal_castlings
+    key ^= (move_key(position.board.squares[king_move[0]], *king_move)
+            ^ castling_key(position.legal_castlings)
+            ^ castling_key(legal_castlings))
+
+    return king_move, legal_castlings, key
 
 
 def get_castlings(position):
     """
     to get this far means there must be some legal_castlings, 
-    i.e. king and relevant rook has not moved, so don't need to check that
+    i.e. king and relevant rook has not moved.  legal_castlings is not
+    updated on ordinary king / rook moves though, so check they are home
     """
-    df = position.df
+    board = position.board
     legal_castlings = position.legal_castlings[position.to_move]
     out = []
 
-    if 'k' in legal_castlings:
-        if position.to_move == 'white':
-            # check space between is free
-            if not len(df.index.intersection([61, 62])):
-                out.append(CASTLING_ROOK_MOVES['white']['k'])
-        else:
-            # check space between is free
-            if not len(df.index.intersection([5, 6])):
-                out.append(CASTLING_ROOK_MOVES['black']['k'])
+    for side in ['k', 'q']:
+        if side not in legal_castlings:
+            continue
 
+        king_sq, rook_sq, between = CASTLING_SQUARES[position.to_move][side]
+        king, rook = board.squares[king_sq], board.squares[rook_sq]
 
-    if 'q' in legal_castlings:
-        if position.to_move == 'white':
-            # check space between is free
-            if not len(df.index.intersection([57, 58, 59])):
-                out.append(CASTLING_ROOK_MOVES['white']['q'])
-        else:
-            # check space between is free
-            if not len(df.index.intersection([1, 2, 3])):
-                out.append(CASTLING_ROOK_MOVES['black']['q'])
+        if abs(king) != PIECE_INTS['king'] or abs(rook) != PIECE_INTS['rook']:
+            continue
 
-    return out
+        # check space between is free
+        if not any(sq in board for sq in between):
+            out.append(CASTLING_ROOK_MOVES[position.to_move][side])
 
+    return out
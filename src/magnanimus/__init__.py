@@ -2,9 +2,17 @@ from .constants import *
 
 from .Game import Game, get_opponent_move
 from .get_best_move import get_best_move, extend_positions
+from .stats import SearchStats
+from .book import OpeningBook
+from . import tablebase
+from .transposition import TranspositionTable, SharedTranspositionTable
 from . import utils
-from .analyse import analyse_board, analyse_piece
-from .Position import Position, update_df, get_pos_next_moves, is_checked, from_json
+from .analyse import analyse_board, analyse_piece, set_backend
+from . import bitboards
+from .Position import (Position, update_df, get_pos_next_moves, get_legal_moves,
+                       is_checked, from_json, cache_counters,
+                       reset_cache_counters)
+from .Board import Board, make_board
 from .notation import trad_to_int, int_to_trad, vec_to_int_sq
 from .domains import RAW_DOMAINS
 from .print_board import print_board
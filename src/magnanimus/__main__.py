@@ -0,0 +1,7 @@
+"""
+python -m magnanimus: run the UCI engine (see uci.py)
+"""
+
+from .uci import main
+
+raise SystemExit(main())
@@ -1,41 +1,31 @@
-import pandas as pd
-import numpy as np
-
 from .domains import RAW_DOMAINS
 from .scoring import COEFFS, PIECE_BASE_VALUES, PAWN_DIAG_COVER
-from .notation import vec_to_int_sq
+from . import bitboards
+
+# which get_piece_domains analyse_piece uses - see set_backend
+BACKEND = 'array'
 
-def analyse_board(df, squares=None):
+def analyse_board(board, squares=None):
     """
     Generate score, gives_check and next_moves for whole board or
     for an iterable of squares
 
-    Returns the amended board
+    Amends the board in place (callers copy first if reqd) and returns it
     """
 
-    df = df.copy()
-    df[['free', 'attacking', 'defending']] = (
-        df[['free', 'attacking', 'defending']].astype('object'))
-    squares = squares or df.index
+    if squares is None:
+        squares = list(board)
 
     for square in squares:
-        free, just_covering, attacking, defending, gives_check, score = (
-            analyse_piece(square, df)
-        )
-        df.at[square, 'free'] = free 
-        df.at[square, 'attacking'] = attacking 
-        df.at[square, 'just_covering'] = just_covering 
-        df.at[square, 'defending'] = defending 
-        df.at[square, 'gives_check'] = gives_check
-        df.at[square, 'score'] = score
+        board.set_analysis(square, analyse_piece(square, board))
 
-    return df
+    return board
 
 
-def analyse_piece(square, df, verbose=False):
+def analyse_piece(square, board, verbose=False):
     """
     THIS IS WHAT NEEDED
-    Take the row identified by square (pd.Series), and the df
+    Take the piece on square, and the board
     In situ set score, next_moves, gives check
     YOU ARE HERE:
         make this work on a single row / piece
@@ -43,15 +33,19 @@ def analyse_piece(square, df, verbose=False):
             so don't have to later
     """
 
-    free, just_covering, attacking, defending = get_piece_domains(square, df)
+    if BACKEND == 'bitboard':
+        free, just_covering, attacking, defending = (
+            bitboards.get_piece_domains(square, board))
+    else:
+        free, just_covering, attacking, defending = (
+            get_piece_domains(square, board))
 
     # scoring
-    base = PIECE_BASE_VALUES[df.loc[square, 'piece']]
+    base = PIECE_BASE_VALUES[board.piece(square)]
     scores = { 'free': 0, 'attack': 0, 'defend': 0, 'checks': 0}
 
-    # free may be a nested list, so flatten (row, col for each)
     if free is not None:
-        scores['free'] = base * COEFFS['free'] * len(np.array(free).flatten()) / 2
+        scores['free'] = base * COEFFS['free'] * len(free) / 2
 
     if defending is not None:
         scores['defend'] = COEFFS['defending'] * len(defending)
@@ -60,7 +54,7 @@ def analyse_piece(square, df, verbose=False):
     if attacking is not None:
         attack = 0
         for sq in attacking:
-            target = df.loc[sq, 'piece']
+            target = board.piece(sq)
             if target == 'king':
                 gives_check = True
                 scores['check'] = COEFFS['check']
@@ -69,7 +63,7 @@ def analyse_piece(square, df, verbose=False):
                                      * COEFFS['attacking'])
 
     score = sum(scores.values())
-    if df.loc[square, 'color'] == 'black':
+    if board.squares[square] < 0:
         score =  - score
 
     if verbose:
@@ -81,7 +75,7 @@ def analyse_piece(square, df, verbose=False):
     return free, just_covering, attacking, defending, gives_check, score
 
 
-def get_piece_domains(square, df):
+def get_piece_domains(square, board):
     """
     Get the actual square domains affected by the piece.
     Return these lists of squares:
@@ -90,8 +84,8 @@ def get_piece_domains(square, df):
         attacking     - squares with enemy the piece is attacking
         defending     - squares with friend the piece is defending
     """
-    p_name = df.loc[square, 'piece']
-    p_color = df.loc[square, 'color']
+    p_name = board.piece(square)
+    p_color = board.color(square)
     # pawns move directionally - need to know color
     if p_name == 'pawn':
         p_name = p_color[0] + '_pawn'
@@ -111,10 +105,10 @@ def get_piece_domains(square, df):
             # work outwards
             for square in direction:
                 # square is unoccupied
-                if not square in df.index:
+                if not square in board:
                     free.append(square)
                 # square has friendly piece
-                elif df.loc[square, 'color'] == p_color:
+                elif board.color(square) == p_color:
                     defending.append(square)
                     break # break because in a directional sequence
                 # square has enemy piece
@@ -126,10 +120,10 @@ def get_piece_domains(square, df):
         # these pieces have nondirectional domains
         for square in raw_domains:
             # square is unoccupied
-            if not square in df.index:
+            if not square in board:
                 free.append(square)
             # square has friendly piece
-            elif df.loc[square, 'color'] == p_color:
+            elif board.color(square) == p_color:
                 defending.append(square)
                 continue # not a directional sequence, just a set
             # square has enemy piece
@@ -141,16 +135,27 @@ def get_piece_domains(square, df):
         # raw domain for pawns has special structure, distinguishing squares
         # that are ahead (can move to) vs diagonal (can take on)
         for square in raw_domains['ahead']:
-            if not square in df.index:
+            if not square in board:
                 free.append(square)
 
         for square in raw_domains['diagonal']:
-            if not square in df.index:
+            if not square in board:
                 just_covering.append(square)
-            elif df.loc[square, 'color'] == p_color:
+            elif board.color(square) == p_color:
                 defending.append(square)
             else:
                 attacking.append(square)
 
     return free, just_covering, attacking, defending
 
+
+
+def set_backend(name):
+    """
+    Choose how piece domains are found: 'array' walks RAW_DOMAINS square
+    by square, 'bitboard' uses the masks in bitboards.py
+    """
+    global BACKEND
+    if name not in ['array', 'bitboard']:
+        raise ValueError(f'unknown backend {name}')
+    BACKEND = name
@@ -0,0 +1,317 @@
+"""
+Benchmarks for the hot paths, on a fixed corpus of positions, with a
+JSON baseline to compare against.
+
+    python -m magnanimus.benchmark --save     # record the baseline
+    python -m magnanimus.benchmark            # compare, exit 1 if worse
+
+Each benchmark reports ops/sec (best of ROUNDS rounds, each running for
+at least MIN_ROUND_SEC) and the peak memory traced over one pass of the
+corpus.  A
+benchmark regresses if its ops/sec falls, or its peak memory rises, by
+more than the threshold (default 20%) against the baseline.
+
+The 'import' benchmark is cold start: `import magnanimus` in a fresh
+interpreter, as imports/sec and peak KB.  It also regresses if any of
+LAZY_MODULES gets imported with the package.
+
+Timings are only comparable on the same machine, so the baseline lives
+in DATA_DIR rather than the repo.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from .constants import DATA_DIR
+from .Position import Position, update_df, get_pos_next_moves
+from .analyse import analyse_board, analyse_piece
+from .get_best_move import get_best_move
+from .notation import trad_to_int
+from .test_tuples import SIMPLES, IN_CHECK, CHECKMATE_IMMINENT
+
+BASELINE_PATH = DATA_DIR / 'benchmark_baseline.json'
+
+THRESHOLD = 0.2
+# peak memory changes smaller than this are noise, whatever the threshold
+MEMORY_SLACK_KB = 64
+ROUNDS = 3
+MIN_ROUND_SEC = 0.2
+IMPORT_ROUNDS = 10
+
+# slow to import, so imported inside the functions that use them, not with
+# the package (the 'import' benchmark checks none of them is)
+LAZY_MODULES = ['pandas', 'numpy', 'termcolor', 'my_tools', 'multiprocessing']
+
+# run in a fresh interpreter, with argv[1] 'time' or 'memory'
+IMPORT_CODE = """
+import sys, time, tracemalloc
+if sys.argv[1] == 'memory':
+    tracemalloc.start()
+start = time.perf_counter()
+import magnanimus
+seconds = time.perf_counter() - start
+eager = [name for name in sys.argv[2:] if name in sys.modules]
+print(seconds, tracemalloc.get_traced_memory()[1] / 1024, *eager)
+"""
+
+MIDDLEGAME_MOVES = ('e2e4 e7e5 g1f3 b8c6 f1c4 f8c5 c2c3 g8f6 '
+                    'd2d3 d7d6 b1d2 c8e6 c4e6 f7e6 d1b3 d8d7').split()
+
+
+def make_corpus():
+    """
+    Return {name: Position} for the fixed corpus
+    """
+    middlegame = Position(to_move='white')
+    for move in MIDDLEGAME_MOVES:
+        middlegame.push(trad_to_int(move))
+
+    return {
+        'opening': Position(to_move='white'),
+        'middlegame': middlegame,
+        'simples': Position(init_seed=SIMPLES, to_move='white'),
+        'in_check': Position(init_seed=IN_CHECK, to_move='white'),
+        'checkmate_imminent': Position(init_seed=CHECKMATE_IMMINENT,
+                                       to_move='white'),
+    }
+
+
+def make_benchmarks(corpus):
+    """
+    Return {name: (function, ops per call)}.  Each function does its work
+    once over the whole corpus
+    """
+    positions = list(corpus.values())
+    moves = [(position, move) for position in positions
+             for move in position.legal_moves()]
+    board_moves = [(position, move) for position, move in moves
+                   if move[0] < 100]
+    pieces = [(square, position.board) for position in positions
+              for square in position.board]
+    searched = [corpus['opening'], corpus['middlegame']]
+
+    def bench_analyse_board():
+        # re-analysing in place gives the same analysis, so can repeat
+        for position in positions:
+            analyse_board(position.board)
+
+    def bench_analyse_piece():
+        for square, board in pieces:
+            analyse_piece(square, board)
+
+    def bench_update_df():
+        # castlings are two board moves, made by Position.make_move
+        for position, move in board_moves:
+            update_df(position.board.copy(), move)
+
+    def bench_get_pos_next_moves():
+        for position in positions:
+            get_pos_next_moves(position)
+
+    def bench_position_init():
+        for position in positions:
+            Position(init_seed=position.board.to_tuples(),
+                     to_move=position.to_move)
+
+    def bench_position_child():
+        for position, move in moves:
+            Position(prev_posn=position, new_move=move)
+
+    def bench_push_pop():
+        for position, move in moves:
+            position.push(move)
+            position.pop()
+
+    def bench_best_move_breadth():
+        for position in searched:
+            get_best_move(position, 2)
+
+    def bench_best_move_alphabeta():
+        for position in searched:
+            get_best_move(position, 3, mode='alphabeta')
+
+    return {
+        'analyse_board': (bench_analyse_board, len(positions)),
+        'analyse_piece': (bench_analyse_piece, len(pieces)),
+        'update_df': (bench_update_df, len(board_moves)),
+        'get_pos_next_moves': (bench_get_pos_next_moves, len(positions)),
+        'position_init': (bench_position_init, len(positions)),
+        'position_child': (bench_position_child, len(moves)),
+        'push_pop': (bench_push_pop, len(moves)),
+        'get_best_move_breadth': (bench_best_move_breadth, len(searched)),
+        'get_best_move_alphabeta': (bench_best_move_alphabeta, len(searched)),
+    }
+
+
+def time_function(function, ops):
+    """
+    Return best ops/sec over ROUNDS rounds
+    """
+    best = 0
+    for _ in range(ROUNDS):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            function()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_ROUND_SEC:
+                break
+        best = max(best, calls * ops / elapsed)
+    return best
+
+
+def peak_memory_kb(function):
+    """
+    Return peak memory allocated during one call, in KB
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def import_once(mode):
+    """
+    Import magnanimus (this copy of it) in a fresh interpreter, returning
+    (seconds, peak KB if mode is 'memory', LAZY_MODULES it imported)
+    """
+    env = dict(os.environ)
+    src_dir = str(Path(__file__).resolve().parents[1])
+    env['PYTHONPATH'] = os.pathsep.join(
+        path for path in [src_dir, env.get('PYTHONPATH')] if path)
+
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_CODE, mode, *LAZY_MODULES],
+        env=env, capture_output=True, text=True, check=True).stdout.split()
+
+    return float(output[0]), float(output[1]), output[2:]
+
+
+def bench_import():
+    """
+    Cold start import, as {'ops_per_sec', 'peak_kb', 'eager'} (imports/sec
+    from the best of IMPORT_ROUNDS)
+    """
+    best = min(import_once('time')[0] for _ in range(IMPORT_ROUNDS))
+    _, peak_kb, eager = import_once('memory')
+    return {'ops_per_sec': 1 / best, 'peak_kb': peak_kb, 'eager': eager}
+
+
+def run(only=None):
+    """
+    Return {benchmark name: {'ops_per_sec', 'peak_kb'}}
+    """
+    out = {}
+    if not only or 'import' in only:
+        out['import'] = bench_import()
+
+    benchmarks = make_benchmarks(make_corpus())
+    for name, (function, ops) in benchmarks.items():
+        if only and name not in only:
+            continue
+        out[name] = {
+            'ops_per_sec': time_function(function, ops),
+            'peak_kb': peak_memory_kb(function),
+        }
+    return out
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    Return {name: list of regressions (as strings)} for results worse
+    than baseline by more than threshold
+    """
+    out = {}
+    for name, result in results.items():
+        problems = []
+        if result.get('eager'):
+            problems.append(f'imports {", ".join(result["eager"])}')
+
+        base = baseline.get(name)
+        if base is not None:
+            if result['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold):
+                problems.append(f'ops/sec {result["ops_per_sec"]:,.1f} vs '
+                                f'{base["ops_per_sec"]:,.1f}')
+            if (result['peak_kb']
+                > base['peak_kb'] * (1 + threshold) + MEMORY_SLACK_KB):
+                problems.append(f'peak {result["peak_kb"]:,.0f}KB vs '
+                                f'{base["peak_kb"]:,.0f}KB')
+
+        if problems:
+            out[name] = problems
+    return out
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path, 'r') as fp:
+        return json.load(fp)['results']
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    out = {
+        'saved': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.node(),
+        'results': results,
+    }
+    with open(path, 'w') as fp:
+        json.dump(out, fp, indent=4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m magnanimus.benchmark',
+        description='Time the hot paths against a saved baseline')
+    parser.add_argument('--save', action='store_true',
+                        help='save the results as the baseline')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH))
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='fractional change counted as a regression')
+    parser.add_argument('--only', nargs='+', help='benchmark names')
+    args = parser.parse_args(argv)
+
+    baseline_path = Path(args.baseline)
+
+    results = run(args.only)
+
+    baseline = {}
+    if baseline_path.exists() and not args.save:
+        baseline = load_baseline(baseline_path)
+
+    for name, result in results.items():
+        line = (f'{name:<26} {result["ops_per_sec"]:>12,.1f} ops/s '
+                f'{result["peak_kb"]:>10,.0f} KB')
+        if name in baseline:
+            change = result['ops_per_sec'] / baseline[name]['ops_per_sec'] - 1
+            line += f'  {change:+.0%}'
+        print(line)
+
+    if args.save:
+        save_baseline(results, baseline_path)
+        print(f'saved baseline to {baseline_path}')
+        return 0
+
+    if not baseline:
+        print(f'no baseline at {baseline_path}, run with --save first')
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, problems in regressions.items():
+        print(f'REGRESSION {name}: {", ".join(problems)}')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
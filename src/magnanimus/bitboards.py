@@ -0,0 +1,274 @@
+"""
+Optional bitboard backend for the piece domains.
+
+Masks are 64-bit ints with bit n set for square n (same int squares as
+everywhere else).  They are derived from RAW_DOMAINS (see table_cache.py):
+    rays for rook / bishop / queen, as (mask, ordered squares, ascending)
+    flat masks for knight and king
+    pawn ahead squares and diagonal masks, by color
+
+The Board keeps occupancy masks up to date, so finding where a ray is
+blocked is a single and / lowest or highest bit, rather than a walk
+along the ray testing each square.
+
+To use it for analysis:
+    from magnanimus.analyse import set_backend
+    set_backend('bitboard')
+"""
+
+from . import domains, notation
+from .domains import RAW_DOMAINS
+from .constants import PIECE_INTS
+from .utils import invert_color
+from .table_cache import cached_tables
+
+
+def mask_of(squares):
+    mask = 0
+    for square in squares:
+        mask |= 1 << square
+    return mask
+
+
+def squares_of(mask):
+    """
+    Return list of squares set in mask, ascending
+    """
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+def make_rays(square, p_name):
+    """
+    Return (mask, squares, ascending, positions) for each ray, where
+    positions maps each square to its index along the ray
+    """
+    out = []
+    for ray in RAW_DOMAINS[square][p_name]:
+        ray = list(ray)
+        out.append((mask_of(ray), ray, ray[0] > square,
+                    {sq: i for i, sq in enumerate(ray)}))
+    return out
+
+
+SLIDERS = {
+    PIECE_INTS['rook']: 'rook',
+    PIECE_INTS['bishop']: 'bishop',
+    PIECE_INTS['queen']: 'queen',
+}
+
+def make_tables():
+    """
+    Return the masks derived from RAW_DOMAINS, by table name
+    """
+    pawn_diagonals = {
+        color: [mask_of(RAW_DOMAINS[sq][color[0] + '_pawn']['diagonal'])
+                for sq in range(64)]
+        for color in ['white', 'black']
+    }
+
+    return {
+        'rays': {
+            kind: [make_rays(sq, p_name) for sq in range(64)]
+            for kind, p_name in SLIDERS.items()
+        },
+
+        'step_masks': {
+            PIECE_INTS['knight']: [mask_of(RAW_DOMAINS[sq]['knight'])
+                                   for sq in range(64)],
+            PIECE_INTS['king']: [mask_of(RAW_DOMAINS[sq]['king'])
+                                 for sq in range(64)],
+        },
+
+        'pawn_ahead': {
+            color: [RAW_DOMAINS[sq][color[0] + '_pawn']['ahead']
+                    for sq in range(64)]
+            for color in ['white', 'black']
+        },
+
+        'pawn_diagonals': pawn_diagonals,
+
+        # squares from which a pawn of color hits the square
+        'pawn_attackers': {
+            color: [mask_of(sq_from for sq_from in range(64)
+                            if pawn_diagonals[color][sq_from] >> sq & 1)
+                    for sq in range(64)]
+            for color in ['white', 'black']
+        },
+    }
+
+
+TABLES = cached_tables('bitboards', make_tables,
+                       [__file__, domains.__file__, notation.__file__])
+
+RAYS = TABLES['rays']
+STEP_MASKS = TABLES['step_masks']
+PAWN_AHEAD = TABLES['pawn_ahead']
+PAWN_DIAGONALS = TABLES['pawn_diagonals']
+PAWN_ATTACKERS = TABLES['pawn_attackers']
+
+
+def get_piece_domains(square, board):
+    """
+    Bitboard version of analyse.get_piece_domains, returning the same
+    free, just_covering, attacking, defending squares
+    """
+    code = board.squares[square]
+    color = 'white' if code > 0 else 'black'
+    own = board.occ[color]
+    enemy = board.occ[invert_color(color)]
+    occ = own | enemy
+    kind = abs(code)
+
+    free = []
+    attacking = []
+    just_covering = []
+    defending = []
+
+    if kind in RAYS:
+        for mask, ray, ascending, positions in RAYS[kind][square]:
+            blockers = mask & occ
+            if not blockers:
+                free.extend(ray)
+                continue
+            # nearest blocker is lowest bit going up, highest going down
+            if ascending:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            free.extend(ray[:positions[blocker]])
+            if own >> blocker & 1:
+                defending.append(blocker)
+            else:
+                attacking.append(blocker)
+
+    elif kind in STEP_MASKS:
+        mask = STEP_MASKS[kind][square]
+        free = squares_of(mask & ~occ)
+        defending = squares_of(mask & own)
+        attacking = squares_of(mask & enemy)
+
+    else: # pawn
+        for sq in PAWN_AHEAD[color][square]:
+            if not occ >> sq & 1:
+                free.append(sq)
+
+        mask = PAWN_DIAGONALS[color][square]
+        just_covering = squares_of(mask & ~occ)
+        defending = squares_of(mask & own)
+        attacking = squares_of(mask & enemy)
+
+    return free, just_covering, attacking, defending
+
+
+def slider_attacks(square, kind, occ):
+    """
+    Return mask of squares a slider of kind on square reaches, up to and
+    including the first blocker on each ray
+    """
+    out = 0
+    for mask, ray, ascending, positions in RAYS[kind][square]:
+        blockers = mask & occ
+        if not blockers:
+            out |= mask
+            continue
+        if ascending:
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        out |= mask_of(ray[:positions[blocker] + 1])
+    return out
+
+
+def attackers_mask(board, square, by_color, occ=None):
+    """
+    Return mask of the by_color pieces hitting square.  Pass occ to
+    override the occupancy used for sliders (eg to look through a king)
+    """
+    sign = 1 if by_color == 'white' else -1
+    masks = board.masks
+    if occ is None:
+        occ = board.occ['white'] | board.occ['black']
+
+    def pieces(name):
+        return masks[PIECE_INTS[name] * sign + 6]
+
+    out = STEP_MASKS[PIECE_INTS['knight']][square] & pieces('knight')
+    out |= STEP_MASKS[PIECE_INTS['king']][square] & pieces('king')
+    out |= PAWN_ATTACKERS[by_color][square] & pieces('pawn')
+
+    queens = pieces('queen')
+    rooks = pieces('rook') | queens
+    if rooks:
+        out |= slider_attacks(square, PIECE_INTS['rook'], occ) & rooks
+    bishops = pieces('bishop') | queens
+    if bishops:
+        out |= slider_attacks(square, PIECE_INTS['bishop'], occ) & bishops
+
+    return out
+
+
+def is_attacked(board, square, by_color, occ=None):
+    return attackers_mask(board, square, by_color, occ) != 0
+
+
+def nearest(blockers, ascending):
+    """
+    Return the square of the blocker nearest the start of a ray
+    """
+    if ascending:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+def king_lines(board, color):
+    """
+    Return (checkers, evasions, pinned) for color's king:
+        checkers: mask of enemy pieces giving check
+        evasions: mask of squares a move other than by the king must land
+                  on to answer a single check (the checker, and any squares
+                  between it and the king) - all squares if not in check
+        pinned:   dict of pinned square -> mask of squares it may move to
+                  (along the pin, up to and including the pinner)
+    """
+    king_sq = board.king_square(color)
+    enemy = invert_color(color)
+    own, theirs = board.occ[color], board.occ[enemy]
+    occ = own | theirs
+    sign = -1 if enemy == 'black' else 1
+
+    checkers = attackers_mask(board, king_sq, enemy)
+    evasions = checkers if checkers else ~0
+    pinned = {}
+
+    queens = board.masks[PIECE_INTS['queen'] * sign + 6]
+    for kind in [PIECE_INTS['rook'], PIECE_INTS['bishop']]:
+        sliders = board.masks[kind * sign + 6] | queens
+        if not sliders:
+            continue
+
+        for mask, ray, ascending, positions in RAYS[kind][king_sq]:
+            if not mask & sliders:
+                continue
+            blockers = mask & occ
+            first = nearest(blockers, ascending)
+
+            if sliders >> first & 1:
+                # checker on this ray: blocking squares are evasions too
+                evasions |= mask_of(ray[:positions[first]])
+                continue
+            if not own >> first & 1:
+                continue
+
+            beyond = blockers ^ 1 << first
+            if not beyond:
+                continue
+            second = nearest(beyond, ascending)
+            if sliders >> second & 1:
+                pinned[first] = mask_of(ray[:positions[second] + 1])
+
+    return checkers, evasions, pinned
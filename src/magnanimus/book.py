@@ -0,0 +1,131 @@
+"""
+Opening book: moves played from a position in a set of PGN games, looked
+up by the position's zobrist key.  Books are built by pgn.py:
+
+    python -m magnanimus.pgn games.pgn more_games.pgn    # build BOOK_PATH
+
+The book is a file of fixed RECORD records (key, from, to, weight),
+sorted by key then move, so a lookup is a binary search over the file
+memory-mapped - nothing is loaded, and it costs O(log n) record reads.
+The weight is the number of games the move was played in from that
+position (capped at MAX_WEIGHT).
+"""
+
+import mmap
+import os
+import random
+import struct
+from pathlib import Path
+
+from .constants import DATA_DIR
+from .utils import atomic_write
+
+BOOK_PATH = DATA_DIR / 'book.bin'
+
+# key, from square, to square, weight
+RECORD = struct.Struct('<QBBH')
+KEY = struct.Struct('<Q')
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook():
+    """
+    Reader for a book file made by pgn.build_book
+
+    random_pick: choose between book moves at random, in proportion to
+    their weights (from seed), rather than always the heaviest
+    """
+    def __init__(self, path=BOOK_PATH, random_pick=False, seed=None):
+        self.path = Path(path)
+        self.random_pick = random_pick
+        self.rng = random.Random(seed)
+
+        with open(self.path, 'rb') as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size % RECORD.size:
+                raise ValueError(f'{path}: not a book file, size {size} is '
+                                 f'not a multiple of {RECORD.size}')
+            # can't map an empty file
+            self.mm = (mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                       if size else None)
+
+        self.n_records = size // RECORD.size
+
+    def __len__(self):
+        return self.n_records
+
+    def __repr__(self):
+        return f'OpeningBook({str(self.path)!r}, {self.n_records} records)'
+
+    def probe(self, key):
+        """
+        Return [(move, weight)] for the position with key, in move order
+        """
+        mm = self.mm
+        lo, hi = 0, self.n_records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if KEY.unpack_from(mm, mid * RECORD.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        out = []
+        for i in range(lo, self.n_records):
+            record_key, sq_from, sq_to, weight = RECORD.unpack_from(
+                mm, i * RECORD.size)
+            if record_key != key:
+                break
+            out.append(((sq_from, sq_to), weight))
+
+        return out
+
+    def moves(self, position):
+        """
+        Return [(move, weight)] for position, leaving out any not legal
+        (a key collision)
+        """
+        entries = self.probe(position.key)
+        if not entries:
+            return []
+        legal_moves = position.legal_moves() or []
+        return [(move, weight) for move, weight in entries
+                if move in legal_moves]
+
+    def move(self, position):
+        """
+        Return a book move for position, or None if out of book
+        """
+        entries = self.moves(position)
+        if not entries:
+            return None
+
+        if self.random_pick:
+            moves, weights = zip(*entries)
+            return self.rng.choices(moves, weights)[0]
+
+        return max(entries, key=lambda entry: entry[1])[0]
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+
+def open_book(path=BOOK_PATH, **kwargs):
+    """
+    Return an OpeningBook for path, or None if there is no book there
+    """
+    if path is None or not Path(path).exists():
+        return None
+    return OpeningBook(path, **kwargs)
+
+
+def write_book(records, path=BOOK_PATH):
+    """
+    Write sorted (key, from, to, weight) records to path - atomically, so
+    a book already open keeps reading the old file
+    """
+    with atomic_write(path) as fp:
+        for record in records:
+            fp.write(RECORD.pack(*record))
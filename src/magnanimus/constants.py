@@ -1,9 +1,12 @@
 from pathlib import Path
-from my_tools.logging import get_filelog
+
+from .logs import LazyLog
 
 DATA_DIR = Path('~/.magnanimus/data').expanduser()
 LOG_DIR = Path('~/.magnanimus/logs').expanduser()
-LOG = get_filelog(logfile_path=LOG_DIR / 'magnanimus.log')
+# made on first use, with file writes on a listener thread, not the
+# search's (see logs.py)
+LOG = LazyLog(LOG_DIR / 'magnanimus.log')
 
 PIECE_CODES = {
     'pawn': 'p',
@@ -16,6 +19,20 @@ PIECE_CODES = {
 
 REV_PIECE_CODES = { v: k for k, v in PIECE_CODES.items() }
 
+# int8 codes used by the Board array: white positive, black negative
+PIECE_INTS = {
+    'pawn': 1,
+    'knight': 2,
+    'bishop': 3,
+    'rook': 4,
+    'queen': 5,
+    'king': 6,
+}
+
+REV_PIECE_INTS = { v: k for k, v in PIECE_INTS.items() }
+
+COLOR_SIGNS = {'white': 1, 'black': -1}
+
 INIT_BOARD_TUPLES = (
     [(REV_PIECE_CODES[pc], 'black', sq)
      for sq, pc in enumerate('rnbqkbnr')] + 
@@ -51,3 +68,9 @@ CASTLING_ROOK_MOVES = {
     'black': {'k': (107, 5), 'q': (100, 3)},
     'white': {'k': (163, 61), 'q': (156, 59)},
 }
+
+# king square, rook square, squares that must be empty
+CASTLING_SQUARES = {
+    'black': {'k': (4, 7, [5, 6]), 'q': (4, 0, [1, 2, 3])},
+    'white': {'k': (60, 63, [61, 62]), 'q': (60, 56, [57, 58, 59])},
+}
@@ -1,5 +1,4 @@
 import operator
-import pandas as pd
 
 """
 CONSTANT
@@ -18,7 +17,9 @@ For each square:
     NB covering / moving are same for all pieces except pawns <shrugs>
 """
 
+from . import notation
 from .notation import vec_to_int_sq
+from .table_cache import cached_tables
 
 
 def make_domains(int_squares=False):
@@ -250,4 +251,5 @@ def test_domains():
     print('ok')
 
 
-RAW_DOMAINS = make_domains(int_squares=True)
+RAW_DOMAINS = cached_tables('domains', lambda: make_domains(int_squares=True),
+                            [__file__, notation.__file__])
@@ -0,0 +1,137 @@
+"""
+Bounded frontier for the breadth search in get_best_move.
+
+Children are added one at a time as they are made, and only the best
+max_size are kept, in a heap - so a ply never holds every child at once.
+
+At most max_in_memory of those are kept as Positions.  Beyond that they
+are spilled to a temp file under DATA_DIR as their moves from the root
+(2 bytes a move), and rebuilt from the root when the next ply expands
+them.  So a deeper search runs in a fixed memory envelope, at the cost
+of replaying some moves.
+"""
+
+import heapq
+import struct
+import tempfile
+from itertools import count
+
+from .constants import DATA_DIR
+from .Position import Position
+
+MATED_CODES = [None, 'white', 'black', 'stalemate']
+
+# number of moves, mated code
+RECORD_HEADER = struct.Struct('<BB')
+
+
+class Frontier():
+    """
+    The best max_size positions added, by score - highest first if
+    descending (ie white just moved), else lowest.  Ties go to the
+    position added first, as a stable sort would.
+    """
+    def __init__(self, root, max_size, descending=True, max_in_memory=None,
+                 spill_dir=DATA_DIR):
+        self.root = root
+        self.moves_made = len(root.moves)
+        self.max_size = max_size
+        self.sign = 1 if descending else -1
+        self.max_in_memory = max_in_memory
+        self.spill_dir = spill_dir
+        self.spill_file = None
+
+        # (signed score, -order added, Position or spill file offset)
+        self.heap = []
+        self.order = count()
+        self.in_memory = 0
+        self.spilled = 0
+        # offered, kept or not
+        self.added = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, position):
+        self.added += 1
+        entry = (position.score * self.sign, -next(self.order))
+
+        if len(self.heap) == self.max_size:
+            if entry <= self.heap[0][:2]:
+                return
+            evicted = heapq.heappop(self.heap)
+            if isinstance(evicted[2], Position):
+                self.in_memory -= 1
+
+        if (self.max_in_memory is not None
+            and self.in_memory >= self.max_in_memory):
+            node = self.spill(position)
+        else:
+            node = position
+            self.in_memory += 1
+
+        heapq.heappush(self.heap, entry + (node,))
+
+    def spill(self, position):
+        """
+        Write the position's moves from the root, returning the offset
+        """
+        if self.spill_file is None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            self.spill_file = tempfile.TemporaryFile(dir=self.spill_dir)
+
+        moves = position.moves[self.moves_made:]
+        record = RECORD_HEADER.pack(len(moves),
+                                    MATED_CODES.index(position.mated))
+        record += bytes(sq for move in moves for sq in move)
+
+        self.spill_file.seek(0, 2)
+        offset = self.spill_file.tell()
+        self.spill_file.write(record)
+        self.spilled += 1
+
+        return offset
+
+    def load(self, offset):
+        """
+        Rebuild a spilled position by replaying its moves from the root
+        """
+        self.spill_file.seek(offset)
+        n_moves, mated = RECORD_HEADER.unpack(
+            self.spill_file.read(RECORD_HEADER.size))
+        raw = self.spill_file.read(2 * n_moves)
+
+        position = self.root
+        for i in range(0, len(raw), 2):
+            position = Position(prev_posn=position,
+                                new_move=(raw[i], raw[i + 1]))
+        position.mated = MATED_CODES[mated]
+
+        return position
+
+    def drain(self):
+        """
+        Yield the positions best first, emptying the frontier as it goes
+        """
+        entries = sorted(self.heap, reverse=True)
+        self.heap = []
+        self.in_memory = 0
+
+        for i, (_, _, node) in enumerate(entries):
+            # let go of each position once handed on
+            entries[i] = None
+            yield node if isinstance(node, Position) else self.load(node)
+
+        self.close()
+
+    def best(self):
+        """
+        Return the best position, leaving the frontier as it is
+        """
+        node = max(self.heap)[2]
+        return node if isinstance(node, Position) else self.load(node)
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
@@ -1,22 +1,107 @@
-import pandas as pd
+import logging
+import time
 from datetime import datetime, timedelta
 
 from .constants import LOG
+from .logs import sampled
 from .utils import invert_color
-from .analyse import analyse_board
 from .scoring import CHECKMATE_SCORE, STALEMATE_SCORE
 from .Position import Position
+from .search import iterative_deepening, MAX_DEPTH
+from .ordering import MoveOrderer
+from .parallel import parallel_search
+from .frontier import Frontier
+from . import tablebase
 
 MAX_ITS = 3
 
+# positions kept each ply in breadth mode
+N_TO_RETURN = 500
+
+MODES = ['breadth', 'alphabeta']
+
 # in dev
-def get_best_move(position, max_its=None, return_positions=False):
+def get_best_move(position, max_its=None, return_positions=False,
+                  mode='breadth', table=None, time_sec=None, max_nodes=None,
+                  workers=1, max_in_memory=None, stats=None):
     """
     Calculate future positions and return the best move
+
+    mode:
+        'breadth'   - extend every position each ply, keeping the best
+                      N_TO_RETURN by score (at most max_in_memory of them
+                      as Positions, the rest spilled to disk - see
+                      frontier.py)
+        'alphabeta' - depth-first negamax (see search.py), iteratively
+                      deepening.  With return_positions, positions is the
+                      principal variation's end position
+
+    Either searches until time_sec or max_nodes is used up, or max_its
+    plies if given (MAX_ITS if neither limit is).  The breadth search
+    only stops between plies, with the last completed ply's best move
+
+    table: a TranspositionTable for the alphabeta search to consult and
+    fill - pass the same one each move to reuse earlier searches
+
+    workers: with more than one, the alphabeta search splits the root
+    moves across that many processes (see parallel.py - they share the
+    table if it is a SharedTranspositionTable)
+
+    stats: a SearchStats to fill in (see stats.py) - not collected from
+    parallel workers
+
+    Positions in the endgame tablebases (see tablebase.py) are not
+    searched: the move is looked up
+    """
+    if max_its is None:
+        # with a limit to stop it, the search goes as deep as it can
+        limited = time_sec is not None or max_nodes is not None
+        max_its = MAX_DEPTH if limited else MAX_ITS
+
+    if stats is not None:
+        stats.start()
+
+    try:
+        move = tablebase.best_move(position)
+        if move is not None:
+            LOG.info(f'tablebase move {move}: {tablebase.probe(position)}')
+            if return_positions:
+                return move, [Position(prev_posn=position, new_move=move)]
+            return move
+
+        if mode == 'alphabeta':
+            return get_best_move_alphabeta(position, max_its,
+                                           return_positions, table,
+                                           time_sec, max_nodes, workers,
+                                           stats)
+        elif mode != 'breadth':
+            raise ValueError(f'unknown mode {mode}, use one of {MODES}')
+
+        return get_best_move_breadth(position, max_its, return_positions,
+                                     max_in_memory, stats, time_sec,
+                                     max_nodes)
+
+    finally:
+        if stats is not None:
+            stats.stop()
+            LOG.info(f'search stats: {stats.summary()}')
+
+
+def get_best_move_breadth(position, max_its, return_positions=False,
+                          max_in_memory=None, stats=None, time_sec=None,
+                          max_nodes=None):
+    """
+    Extend every position each ply, keeping the best N_TO_RETURN, for
+    max_its plies - or fewer, if time_sec or max_nodes (positions made) is
+    used up first.  A ply is not started if it can't finish
     """
-    max_its = max_its or MAX_ITS
+    if stats is not None:
+        stats.count_node(0)
 
-    # init the positions list
+    start = time.monotonic()
+    nodes = 0
+
+    # init the positions, then each ply a Frontier of the best
     positions = [position]
     original_to_move = position.to_move
     moves_made = len(position.moves)
@@ -25,15 +110,28 @@ def get_best_move(position, max_its=None, return_positions=False):
     i = 1
     while True:
         LOG.info(f'getting positions for it {i}, with {original_to_move} to move')
-        positions = extend_positions(positions, to_move)
-
-        # filter the positions
-        positions = filter_positions(positions, i, to_move)
+        if i > 1:
+            positions = positions.drain()
+        # children are made one parent at a time, straight into the frontier
+        positions = select_positions(
+            iter_extended_positions(positions, stats, i),
+            position, to_move, max_in_memory, stats)
         to_move = invert_color(to_move)
+        nodes += positions.added
 
         if i == max_its:
             break
 
+        # the next ply makes many times as many positions as this one, so
+        # stop if it can't finish
+        elapsed = time.monotonic() - start
+        if time_sec is not None and elapsed > time_sec / 2:
+            LOG.info(f'stopping after ply {i}: {elapsed:.2f}s')
+            break
+        if max_nodes is not None and nodes >= max_nodes / 2:
+            LOG.info(f'stopping after ply {i}: {nodes} positions')
+            break
+
         i += 1
 
 
@@ -44,37 +142,101 @@ def get_best_move(position, max_its=None, return_positions=False):
 #     else:
 #         best_move = best_position.moves[0]
 
-    if not positions:
+    if not len(positions):
         return 'checkmate', None
 
     # need to re-sort, as will be ordered by the last to_move
-    positions.sort(key=lambda x: x.score, reverse=original_to_move=='white')
+    sign = 1 if original_to_move == 'white' else -1
+    best_position = None
+    kept = []
+    for candidate in positions.drain():
+        if (best_position is None
+            or (candidate.score - best_position.score) * sign > 0):
+            best_position = candidate
+        if return_positions:
+            kept.append(candidate)
 
     # because of zero indexing, the first NEXT move is at moves_made in list
-    best_move = positions[0].moves[moves_made]
+    best_move = best_position.moves[moves_made]
 
     if return_positions:
-        return best_move, positions
+        kept.sort(key=lambda x: x.score, reverse=original_to_move=='white')
+        return best_move, kept
 
     return best_move
 
 
-def filter_positions(positions, i, last_to_move):
+def get_best_move_alphabeta(position, depth, return_positions=False,
+                            table=None, time_sec=None, max_nodes=None,
+                            workers=1, stats=None):
     """
-    Depending on how many iterations, remove positions that are unlikely to 
-    be followed by opponent, or choose not to follow for me
+    Negamax search, returning the first move of the principal variation
+    from the last depth completed
     """
-    N_TO_RETURN = 500
+    LOG.info(f'alphabeta search to depth {depth}, {position.to_move} to move'
+             f' (time {time_sec}s, nodes {max_nodes}, workers {workers})')
+
+    if workers > 1:
+        score, pv, completed = parallel_search(position, depth, time_sec,
+                                               max_nodes, workers, table)
+    else:
+        orderer = MoveOrderer()
+        score, pv, completed = iterative_deepening(position, depth, time_sec,
+                                                   max_nodes, table,
+                                                   orderer=orderer,
+                                                   stats=stats)
+        LOG.info(f'move ordering: {orderer.counters}')
+
+        if table is not None:
+            LOG.info(f'transposition table: {table.counters}')
+
+    if not pv:
+        return 'checkmate', None
 
-    positions.sort(key=lambda x: x.score, reverse=last_to_move=='white')
-    # discard all mates except 1
+    LOG.info(f'best line {pv}, score {score:.2f}, depth {completed}')
+
+    if return_positions:
+        pv_position = position
+        for move in pv:
+            pv_position = Position(prev_posn=pv_position, new_move=move)
+        return pv[0], [pv_position]
+
+    return pv[0]
 
-    if positions[0].mated and positions[0].checked == last_to_move:
+
+def select_positions(positions, root, last_to_move, max_in_memory=None,
+                     stats=None):
+    """
+    Add positions (any iterable) to a Frontier of the best N_TO_RETURN,
+    and return it - or if the best is a mate against last_to_move, one
+    holding just that
+    """
+    frontier = Frontier(root, N_TO_RETURN, last_to_move=='white',
+                        max_in_memory)
+    for position in positions:
+        if stats is not None:
+            clock = time.perf_counter()
+            frontier.add(position)
+            stats.times['sorting'] += time.perf_counter() - clock
+        else:
+            frontier.add(position)
+
+    if not len(frontier):
+        return frontier
+
+    LOG.info(f'kept {len(frontier)}, {frontier.spilled} spilled to disk')
+
+    # discard all mates except 1
+    best = frontier.best()
+    if best.mated and best.checked == last_to_move:
         LOG.info('Mate inevitable on this position')
-        return [positions[0]]
+        frontier.close()
+        added = frontier.added
+        frontier = Frontier(root, 1, last_to_move=='white')
+        frontier.add(best)
+        frontier.added = added
 
-    LOG.info(f'going to return {min(N_TO_RETURN, len(positions))}')
-    return positions[:N_TO_RETURN]
+    return frontier
 
 
 def extend_positions(positions, timeout=None, sec_to_think=1,
@@ -87,14 +249,27 @@ def extend_positions(positions, timeout=None, sec_to_think=1,
     if timeout is None:
         timeout = datetime.now() + timedelta(seconds=sec_to_think)
 
-    positions_out = []
+    return list(iter_extended_positions(positions))
+
+
+def iter_extended_positions(positions, stats=None, ply=1):
+    """
+    Generate the positions extending those passed (any iterable), one
+    parent at a time - mated / stalemated ones are passed through
+
+    ply is the children's, for stats
+
+    Per-position traces are at debug level, for every
+    logs.DEBUG_SAMPLE_EVERY'th position
+    """
+    debug = LOG.isEnabledFor(logging.DEBUG)
 
     # iterate over each existing position, spawning new ones from its next_moves
     for i,position in enumerate(positions):
 
         # TODO review this
         if position.mated:
-            positions_out.append(position)
+            yield position
             continue
 
         # collect the new positions from this position, before deciding
@@ -107,20 +282,26 @@ def extend_positions(positions, timeout=None, sec_to_think=1,
         else:
             already_in_check = False
 
-        LOG.info(f'extending position {i+1} / {len(positions)}, {position.to_move} to move,'
-                 f' {"they ARE" if position.checked else "NOT"} in check')
-
-        for move in position.next_moves:
-            new_position = Position(prev_posn=position, new_move=move)
-            # need to get who is checked
-            # if its last_to_move, reject
-            if new_position.checked is not None:
-                if position.to_move in new_position.checked:
-                    LOG.info(f'dropping {move}: self check for {position.to_move}')
-                    # not a legit move
-                    continue
-            else:
-                child_positions.append(new_position)
+        if debug and sampled(i):
+            LOG.debug(f'extending position {i+1}, {position.to_move} to move,'
+                      f' {"they ARE" if position.checked else "NOT"} in check')
+
+        # only legal moves, so no child is built just to be dropped
+        if stats is not None:
+            clock = time.perf_counter()
+            moves = position.legal_moves()
+            stats.times['movegen'] += time.perf_counter() - clock
+            stats.count_expansion(len(position.next_moves), len(moves))
+            clock = time.perf_counter()
+        else:
+            moves = position.legal_moves()
+
+        for move in moves:
+            child_positions.append(Position(prev_posn=position, new_move=move))
+
+        if stats is not None:
+            stats.times['analysis'] += time.perf_counter() - clock
+            stats.count_node(ply, len(child_positions))
 
         if not child_positions:
             # no options so mate of some kind
@@ -132,14 +313,9 @@ def extend_positions(positions, timeout=None, sec_to_think=1,
                 # stalemate
                 position.mated = 'stalemate'
 
-            position.next_moves = None
-            positions_out.append(position)
+            yield position
 
         else:
-            positions_out.extend(child_positions)
-
-    # TODO select positions to follow
-
-    return positions_out
+            yield from child_positions
 
 
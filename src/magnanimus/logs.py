@@ -0,0 +1,91 @@
+"""
+Keeping logging off the search's back.
+
+make_async moves a logger's handlers (eg the file handler get_filelog
+makes for LOG) behind a queue: the search thread only puts records on
+it, and a QueueListener thread formats and writes them.
+
+Hot paths should also guard building their messages with a level check,
+and per-node debug traces can be sampled:
+
+    debug = LOG.isEnabledFor(logging.DEBUG)
+    ...
+    if debug and sampled(i):
+        LOG.debug(f'...')
+
+set_debug_sampling(1) traces every node.
+
+LOG itself is a LazyLog, so importing the package neither imports
+my_tools nor opens the log file: that happens the first time it is used.
+"""
+
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# trace every Nth node in debug traces
+DEBUG_SAMPLE_EVERY = 100
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler leaving the formatting to the listener thread too
+    """
+    def prepare(self, record):
+        return record
+
+
+def make_async(logger):
+    """
+    Move logger's handlers behind a queue, and return the started
+    listener (stopped, so flushed, at exit).  Returns None if already done
+    """
+    if any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+        return None
+
+    log_queue = queue.SimpleQueue()
+    handlers = logger.handlers[:]
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    return listener
+
+
+class LazyLog():
+    """
+    Stands in for the file logger at logfile_path, making it (async, see
+    make_async) on first use
+    """
+    def __init__(self, logfile_path):
+        self.logfile_path = logfile_path
+        self.logger = None
+        self.listener = None
+
+    def get_logger(self):
+        if self.logger is None:
+            from my_tools.logging import get_filelog
+            logger = get_filelog(logfile_path=self.logfile_path)
+            self.listener = make_async(logger)
+            self.logger = logger
+        return self.logger
+
+    def __getattr__(self, name):
+        # only called for attributes not set in __init__, ie the logger's
+        return getattr(self.get_logger(), name)
+
+
+def set_debug_sampling(every):
+    global DEBUG_SAMPLE_EVERY
+    DEBUG_SAMPLE_EVERY = max(1, int(every))
+
+
+def sampled(i):
+    """
+    Is the i'th node one to trace
+    """
+    return i % DEBUG_SAMPLE_EVERY == 0
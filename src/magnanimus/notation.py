@@ -9,9 +9,7 @@ def int_to_trad(int_sq):
     'e4'
     """
 
-    rank = int_sq // 8
-    file = int_sq % 8
-    return rank, file
+    return 'abcdefgh'[int_sq % 8] + str(8 - int_sq // 8)
 
 
 def trad_to_int(trad):
@@ -0,0 +1,108 @@
+"""
+Move ordering for the alphabeta search.  The sooner the best move is
+tried, the more of the rest alpha-beta can prune.  Order is:
+
+    1. the hash move (best move stored in the transposition table)
+    2. captures, most valuable victim first, then least valuable attacker
+    3. killer moves: quiet moves that caused a cutoff at the same ply
+    4. other quiet moves, by history score (cutoffs they have caused
+       anywhere, weighted by depth squared)
+"""
+
+from .constants import REV_PIECE_INTS
+from .scoring import PIECE_BASE_VALUES
+
+KILLERS_PER_PLY = 2
+
+# values for ordering by victim / attacker - the king is the attacker we
+# least want to try first
+VICTIM_VALUES = [0] + [PIECE_BASE_VALUES[REV_PIECE_INTS[kind]]
+                       for kind in range(1, 7)]
+ATTACKER_VALUES = VICTIM_VALUES[:6] + [10]
+
+HASH_MOVE, CAPTURE, KILLER, QUIET = 3, 2, 1, 0
+
+
+class MoveOrderer():
+    """
+    Holds the killer and history tables for a search (they carry over
+    between iterative deepening depths), and counters for tuning
+    """
+    def __init__(self):
+        self.killers = {}
+        self.history = {}
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.nodes_ordered = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0 # proportion of these = ordering quality
+        self.cutoffs_by_kind = {kind: 0 for kind in
+                                ['hash', 'capture', 'killer', 'quiet']}
+
+    @property
+    def counters(self):
+        return {
+            'nodes_ordered': self.nodes_ordered,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'first_move_rate': (self.first_move_cutoffs / self.cutoffs
+                                if self.cutoffs else 0),
+            **{f'{kind}_cutoffs': n
+               for kind, n in self.cutoffs_by_kind.items()},
+        }
+
+    def order(self, position, moves, hash_move=None, ply=0):
+        """
+        Return moves sorted best first
+        """
+        self.nodes_ordered += 1
+        squares = position.board.squares
+        killers = self.killers.get(ply, ())
+        history = self.history
+        color = position.to_move
+
+        def key(move):
+            if move == hash_move:
+                return HASH_MOVE, 0
+            victim = squares[move[1]] if move[0] < 100 else 0
+            if victim:
+                attacker = squares[move[0]]
+                return CAPTURE, (VICTIM_VALUES[abs(victim)] * 100
+                                 - ATTACKER_VALUES[abs(attacker)])
+            if move in killers:
+                return KILLER, -killers.index(move)
+            return QUIET, history.get((color, move), 0)
+
+        return sorted(moves, key=key, reverse=True)
+
+    def is_capture(self, position, move):
+        return move[0] < 100 and position.board.squares[move[1]] != 0
+
+    def cutoff(self, position, move, ply, depth, move_number, hash_move=None):
+        """
+        Record that move (the move_number'th tried) caused a beta cutoff.
+        Call before the move is made, so captures can be recognised
+        """
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+
+        if move == hash_move:
+            self.cutoffs_by_kind['hash'] += 1
+        elif self.is_capture(position, move):
+            self.cutoffs_by_kind['capture'] += 1
+            # captures are already ordered well, don't pollute the tables
+            return
+        elif move in self.killers.get(ply, ()):
+            self.cutoffs_by_kind['killer'] += 1
+        else:
+            self.cutoffs_by_kind['quiet'] += 1
+
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLERS_PER_PLY:]
+
+        history_key = position.to_move, move
+        self.history[history_key] = self.history.get(history_key, 0) + depth * depth
@@ -0,0 +1,168 @@
+"""
+Root-split parallel alphabeta search, over a ProcessPoolExecutor.
+
+Each depth of the iterative deepening:
+    1. the first (best so far) root move is searched alone, with a full
+       window, giving alpha - its younger brothers wait for it
+    2. the rest are searched in rounds of one move per worker, each with
+       the window (alpha, inf), and alpha is raised from a round's results
+       before the next is sent, so later moves prune harder
+
+By default every root move search gets a fresh transposition table and
+move orderer, and the bounds passed only depend on earlier results, never
+on which worker finishes first.  So given the same depth budget the
+result is the same whatever the number of workers (a node budget is split
+between the moves of a round, so depends on how many there are, and time
+limits are of course not deterministic).
+
+Limits are for the whole search: workers are sent an absolute deadline
+(time.time(), as each process has its own monotonic start), and each round
+only the nodes left.
+
+Pass a SharedTranspositionTable and the workers all use it instead, so
+each profits from what the others (and earlier depths and searches) have
+stored - much less work, but what is found first depends on timing, so
+results are no longer deterministic.
+"""
+
+import time
+
+from .constants import LOG
+from .search import (negamax, SearchLimits, SearchAborted, INFINITY,
+                     MAX_DEPTH, MATE_THRESHOLD)
+from .transposition import TranspositionTable, SharedTranspositionTable
+from .ordering import MoveOrderer
+
+# per root move search, in each worker, if not sharing one
+WORKER_TABLE_MB = 1
+
+# the worker's attached SharedTranspositionTable, if any
+SHARED_TABLE = None
+
+
+def init_worker(table):
+    global SHARED_TABLE
+    SHARED_TABLE = table
+
+
+def search_root_move(position, move, depth, alpha, deadline=None,
+                     max_nodes=None, generation=0):
+    """
+    Worker: return (score, pv, nodes) for move, searched to depth plies
+    in all from position.  Raises SearchAborted if a limit is hit: the
+    deadline (a time.time()) or max_nodes
+    """
+    if SHARED_TABLE is not None:
+        table = SHARED_TABLE
+        table.generation = generation
+    else:
+        table = TranspositionTable(WORKER_TABLE_MB)
+
+    time_sec = None if deadline is None else max(deadline - time.time(), 0)
+    limits = SearchLimits(time_sec, max_nodes)
+    position.push(move)
+    score, pv = negamax(position, depth - 1, -INFINITY, -alpha, ply=1,
+                        table=table, limits=limits, orderer=MoveOrderer())
+    return -score, [move] + pv, limits.nodes
+
+
+def parallel_search(position, max_depth=None, time_sec=None, max_nodes=None,
+                    workers=2, table=None):
+    """
+    As search.iterative_deepening, but splitting the root moves across
+    workers processes.  Returns (score, pv, depth) from the last completed
+    depth.
+
+    time_sec and max_nodes are totals: each depth is only started if the
+    nodes left allow, and the root move searches of each round are capped
+    at the nodes left, shared between them
+
+    table: a SharedTranspositionTable for the workers to share (any other
+    table is ignored)
+    """
+    if not isinstance(table, SharedTranspositionTable):
+        table = None
+    else:
+        table.new_search()
+    generation = table.generation if table is not None else 0
+
+    max_depth = max_depth or MAX_DEPTH
+    start = time.monotonic()
+    deadline = None if time_sec is None else time.time() + time_sec
+    root = position.detached()
+
+    moves = root.legal_moves()
+    if not moves:
+        return None, [], 0
+
+    moves = MoveOrderer().order(root, moves)
+    score, pv, completed = None, [], 0
+    nodes = 0
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers, initializer=init_worker,
+                             initargs=(table,)) as pool:
+        for depth in range(1, max_depth + 1):
+            # depth 1 always completes, as in iterative_deepening
+            limited = depth > 1
+            if (limited and max_nodes is not None
+                and max_nodes - nodes <= 0):
+                break
+
+            def submit(move, alpha, share=1):
+                if not limited:
+                    return pool.submit(search_root_move, root, move, depth,
+                                       alpha, None, None, generation)
+                depth_nodes = sum(result[2] for result in results.values())
+                node_cap = (None if max_nodes is None
+                            else max(max_nodes - nodes - depth_nodes, 0)
+                                 // share)
+                return pool.submit(search_root_move, root, move, depth,
+                                   alpha, deadline, node_cap, generation)
+
+            results = {}
+            try:
+                best = submit(moves[0], -INFINITY).result()
+                results[moves[0]] = best
+                alpha = best[0]
+
+                rest = moves[1:]
+                for i in range(0, len(rest), workers):
+                    batch = rest[i:i + workers]
+                    futures = [submit(move, alpha, len(batch))
+                               for move in batch]
+                    for move, future in zip(batch, futures):
+                        results[move] = future.result()
+                    # in move order, so ties go the same way every time
+                    for move in batch:
+                        if results[move][0] > best[0]:
+                            best = results[move]
+                    alpha = max(alpha, best[0])
+
+            except SearchAborted as err:
+                LOG.info(f'parallel depth {depth} aborted: {err}')
+                break
+
+            score, pv, _ = best
+            completed = depth
+            nodes += sum(result[2] for result in results.values())
+            LOG.info(f'parallel depth {depth}: {pv} score {score:.2f}, '
+                     f'{nodes} nodes, {time.monotonic() - start:.2f}s')
+
+            if max_nodes is not None and nodes >= max_nodes:
+                break
+
+            # mate found: deeper won't change anything
+            if abs(score) > MATE_THRESHOLD:
+                break
+
+            if (time_sec is not None
+                and time.monotonic() - start > time_sec / 2):
+                break
+
+            # next depth: best first, then by this depth's scores
+            moves.sort(key=lambda move: (move != pv[0],
+                                         -results[move][0]))
+
+    return score, pv, completed
@@ -0,0 +1,158 @@
+"""
+Perft: count the leaf nodes of the legal move tree to a depth, to check
+move generation against known counts, and time it.
+
+    python -m magnanimus.perft 4
+    python -m magnanimus.perft 3 --seed SIMPLES --divide
+    python -m magnanimus.perft 5 --json position.json --workers 8
+
+Counts follow this engine's rules: no en passant or promotion, and a
+pawn's double step is not blocked by a piece on the square it passes.
+So from the start depth 3 is 8982 rather than the standard 8902 (leaving
+out the blocked double steps gives the standard counts, 8902 and 197281
+at depths 3 and 4).
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .Position import Position, from_json
+from . import test_tuples
+
+# from INIT_BOARD_TUPLES, white to move, by depth
+REFERENCE_COUNTS = {1: 20, 2: 400, 3: 8982, 4: 200915}
+
+
+def perft(position, depth):
+    """
+    Return the number of leaf nodes depth plies below position
+    """
+    if depth == 0:
+        return 1
+
+    moves = position.legal_moves() or []
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        position.push(move)
+        nodes += perft(position, depth - 1)
+        position.pop()
+
+    return nodes
+
+
+def perft_move(position, move, depth):
+    """
+    Leaf nodes depth plies below position, via move (for the pool)
+    """
+    position.push(move)
+    return perft(position, depth - 1)
+
+
+def divide(position, depth, workers=1):
+    """
+    Return {move: leaf nodes below it} for each legal move of position,
+    across a pool of workers processes if more than one
+    """
+    moves = position.legal_moves() or []
+
+    if workers > 1:
+        root = position.detached()
+        with ProcessPoolExecutor(workers) as pool:
+            counts = pool.map(perft_move, [root] * len(moves), moves,
+                              [depth] * len(moves))
+            return dict(zip(moves, counts))
+
+    out = {}
+    for move in moves:
+        position.push(move)
+        out[move] = perft(position, depth - 1)
+        position.pop()
+
+    return out
+
+
+def run(position, depth, workers=1):
+    """
+    Return a dict of nodes, seconds, nodes_per_sec and divide (by move)
+    """
+    start = time.perf_counter()
+    if depth == 0:
+        counts = {}
+        nodes = 1
+    else:
+        counts = divide(position, depth, workers)
+        nodes = sum(counts.values())
+    seconds = time.perf_counter() - start
+
+    return {
+        'nodes': nodes,
+        'seconds': seconds,
+        'nodes_per_sec': nodes / seconds if seconds else 0,
+        'divide': counts,
+    }
+
+
+def load_position(seed=None, json_path=None, to_move='white'):
+    """
+    Position from a test_tuples name (eg 'SIMPLES'), a json file saved by
+    Position.to_json, or the start position
+    """
+    if json_path is not None:
+        return from_json(json_path)
+
+    init_seed = None
+    if seed is not None:
+        try:
+            init_seed = getattr(test_tuples, seed.upper())
+        except AttributeError:
+            raise ValueError(f'unknown seed {seed}, use a name from '
+                             f'test_tuples') from None
+
+    return Position(init_seed=init_seed, to_move=to_move)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m magnanimus.perft',
+        description='Count leaf nodes of the legal move tree')
+    parser.add_argument('depth', type=int)
+    parser.add_argument('--seed', help='test_tuples position, eg SIMPLES')
+    parser.add_argument('--json', help='position saved with to_json')
+    parser.add_argument('--to-move', default='white',
+                        choices=['white', 'black'])
+    parser.add_argument('--divide', action='store_true',
+                        help='show the count below each root move')
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    try:
+        position = load_position(args.seed, args.json, args.to_move)
+    except ValueError as err:
+        parser.error(str(err))
+    result = run(position, args.depth, args.workers)
+
+    if args.divide:
+        for (sq_from, sq_to), nodes in sorted(result['divide'].items()):
+            print(f'{sq_from}-{sq_to}: {nodes}')
+        print()
+
+    print(f'nodes: {result["nodes"]}')
+    print(f'time: {result["seconds"]:.2f}s '
+          f'({result["nodes_per_sec"]:,.0f} nodes/s)')
+
+    if (args.seed is None and args.json is None and args.to_move == 'white'
+        and args.depth in REFERENCE_COUNTS):
+        expected = REFERENCE_COUNTS[args.depth]
+        status = 'ok' if result['nodes'] == expected else 'MISMATCH'
+        print(f'reference: {expected} {status}')
+        return 0 if status == 'ok' else 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,153 @@
+"""
+Building opening books (see book.py) from PGN files.
+
+    python -m magnanimus.pgn games.pgn more_games.pgn
+    python -m magnanimus.pgn games.pgn --plies 16 --min-games 3
+
+Each game is read for its main line (comments, variations and NAGs
+dropped), replayed from the start position for its first BOOK_PLIES
+plies, and every move made counted against the key of the position it
+was made in.  A game stops early at a move this engine can't make
+(promotion, en passant) or can't read.
+"""
+
+import argparse
+import re
+from collections import Counter
+
+from .constants import (PIECE_INTS, REV_PIECE_CODES, COLOR_SIGNS,
+                        CASTLING_ROOK_MOVES)
+from .notation import trad_to_int
+from .Position import Position
+from .book import BOOK_PATH, MAX_WEIGHT, write_book
+
+BOOK_PLIES = 20
+
+# piece, from file, from rank, capture, to square, promotion
+SAN_RE = re.compile(r'([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(=?[NBRQ])?$')
+CASTLING_SAN = {'O-O': 'k', '0-0': 'k', 'O-O-O': 'q', '0-0-0': 'q'}
+
+# removed from movetext before splitting it into moves
+COMMENT_RE = re.compile(r'\{[^}]*\}|;[^\n]*')
+VARIATION_RE = re.compile(r'\([^()]*\)')
+NOISE_RE = re.compile(r'\$\d+|\d+\.(\.\.)?|1-0|0-1|1/2-1/2|\*')
+
+
+def read_pgn(path):
+    """
+    Generate each game in the PGN file at path, as a list of SAN moves
+    """
+    movetext = []
+    with open(path, 'r', errors='replace') as fp:
+        for line in fp:
+            if line.startswith('['):
+                # a tag after moves starts the next game
+                if movetext:
+                    yield parse_movetext(' '.join(movetext))
+                    movetext = []
+            elif line.strip():
+                movetext.append(line)
+
+    if movetext:
+        yield parse_movetext(' '.join(movetext))
+
+
+def parse_movetext(movetext):
+    """
+    Return the SAN moves of the main line of movetext
+    """
+    movetext = COMMENT_RE.sub(' ', movetext)
+    # innermost variations first, till none are left
+    while True:
+        movetext, n_subs = VARIATION_RE.subn(' ', movetext)
+        if not n_subs:
+            break
+    return NOISE_RE.sub(' ', movetext).split()
+
+
+def san_to_move(position, san):
+    """
+    Return the legal move of position that san describes, or None if
+    there isn't exactly one
+    """
+    san = san.rstrip('+#!?')
+    legal_moves = position.legal_moves() or []
+
+    if san in CASTLING_SAN:
+        move = CASTLING_ROOK_MOVES[position.to_move][CASTLING_SAN[san]]
+        return move if move in legal_moves else None
+
+    match = SAN_RE.match(san)
+    if match is None:
+        return None
+    piece, from_file, from_rank, _, to_square, promotion = match.groups()
+    if promotion is not None:
+        return None
+
+    code = (PIECE_INTS[REV_PIECE_CODES[(piece or 'p').lower()]]
+            * COLOR_SIGNS[position.to_move])
+    sq_to = trad_to_int(to_square)
+    squares = position.board.squares
+
+    candidates = [
+        move for move in legal_moves
+        if move[0] < 100 and move[1] == sq_to and squares[move[0]] == code
+        and (from_file is None or move[0] % 8 == 'abcdefgh'.find(from_file))
+        and (from_rank is None or 8 - move[0] // 8 == int(from_rank))
+    ]
+
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def build_book(pgn_paths, path=BOOK_PATH, max_plies=BOOK_PLIES,
+               min_games=1):
+    """
+    Make a book at path from the games in pgn_paths, keeping moves played
+    in at least min_games of them.  Return a dict of counts
+    """
+    counts = Counter()
+    n_games = 0
+    for pgn_path in pgn_paths:
+        for sans in read_pgn(pgn_path):
+            n_games += 1
+            position = Position(to_move='white')
+            for san in sans[:max_plies]:
+                move = san_to_move(position, san)
+                if move is None:
+                    break
+                counts[(position.key, *move)] += 1
+                position.push(move)
+
+    records = sorted((key, sq_from, sq_to, min(count, MAX_WEIGHT))
+                     for (key, sq_from, sq_to), count in counts.items()
+                     if count >= min_games)
+    write_book(records, path)
+
+    return {
+        'games': n_games,
+        'positions': len({record[0] for record in records}),
+        'records': len(records),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m magnanimus.pgn',
+        description='Build an opening book from PGN files')
+    parser.add_argument('pgn', nargs='+')
+    parser.add_argument('--out', default=str(BOOK_PATH))
+    parser.add_argument('--plies', type=int, default=BOOK_PLIES,
+                        help='plies read from the start of each game')
+    parser.add_argument('--min-games', type=int, default=1,
+                        help='games a move must be played in to be kept')
+    args = parser.parse_args(argv)
+
+    result = build_book(args.pgn, args.out, args.plies, args.min_games)
+    print(f'{result["games"]} games, {result["positions"]} positions, '
+          f'{result["records"]} moves, saved to {args.out}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,84 @@
+"""
+Pondering: searching on the opponent's time.
+
+While the opponent thinks, a Ponderer searches in a background thread
+the position after the reply the last search predicted (the second move
+of its principal variation).  When the reply comes:
+    hit:   the search carries on, now with the time for the move, and its
+           result is the answer (at once, if it had already finished)
+    miss:  the search is stopped (SearchLimits.stop) and its work
+           discarded - but for what it left in the transposition table
+
+With no predicted reply the position itself is searched, which at least
+fills the table for all the replies.
+
+The search is on a copy of the position, so the game can carry on using
+its own (eg checking the opponent's move is legal) meanwhile.  Only one
+search should use the table at a time: stop or finish the Ponderer before
+searching with it.
+"""
+
+import threading
+import time
+
+from .constants import LOG
+from .search import iterative_deepening, SearchLimits
+from .ordering import MoveOrderer
+
+
+class Ponderer():
+    """
+    Search position after predicted (or position itself, if None) to
+    max_depth, in a thread started by start()
+    """
+    def __init__(self, position, predicted, table, max_depth):
+        self.predicted = predicted
+        self.position = position.detached()
+        if predicted is not None:
+            self.position.push(predicted)
+        self.table = table
+        self.max_depth = max_depth
+        self.limits = SearchLimits()
+        self.result = None
+        self.thread = threading.Thread(target=self.search, daemon=True)
+
+    def __repr__(self):
+        return (f'Ponderer(predicted {self.predicted}, '
+                f'{"running" if self.thread.is_alive() else "done"}, '
+                f'{self.limits.nodes} nodes)')
+
+    def start(self):
+        LOG.info(f'pondering on {self.predicted}')
+        self.thread.start()
+        return self
+
+    def search(self):
+        self.result = iterative_deepening(self.position, self.max_depth,
+                                          table=self.table,
+                                          limits=self.limits,
+                                          orderer=MoveOrderer())
+
+    def is_hit(self, move):
+        return self.predicted is not None and move == self.predicted
+
+    def stop(self):
+        """
+        Stop the search and wait for it
+        """
+        self.limits.stop()
+        self.thread.join()
+        LOG.info(f'stopped pondering on {self.predicted} after '
+                 f'{self.limits.nodes} nodes')
+
+    def finish(self, time_sec=None):
+        """
+        The predicted move was played: give the search time_sec more (from
+        now) to finish, and return its (score, pv, depth)
+        """
+        self.limits.start = time.monotonic()
+        if time_sec is not None:
+            self.limits.deadline = self.limits.start + time_sec
+        self.thread.join()
+        LOG.info(f'ponder hit on {self.predicted}: {self.result}, '
+                 f'{self.limits.nodes} nodes')
+        return self.result
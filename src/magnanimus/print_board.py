@@ -1,5 +1,3 @@
-from termcolor import cprint
-
 from .constants import PIECE_UNICODES
 from .utils import make_board_df
 from .notation import vec_to_int_sq
@@ -12,6 +10,7 @@ def print_board(board_df=None, to_move=None, scores=None, hlights=None, use_ints
 
     pass a list of squares to hlights and they will be identified with | |
     """
+    from termcolor import cprint
 
     df = board_df
 
@@ -0,0 +1,179 @@
+"""
+Generating the endgame tablebases (see tablebase.py) by retrograde
+analysis, offline:
+
+    python -m magnanimus.retrograde             # all, in TABLE_DIR
+    python -m magnanimus.retrograde KRK --dir /some/where
+
+Working back from the mates: a white to move position wins if any move
+reaches a black to move loss, and a black to move position is lost once
+every one of its moves reaches a white win (counted down from its number
+of moves).  Each pass of both finds the mates one move longer, so the
+first found is the shortest.  Whatever is left is drawn.
+
+Moves follow this engine's rules, with the masks from bitboards.py.  A
+table takes a few seconds.
+"""
+
+import argparse
+import time
+
+from .bitboards import (STEP_MASKS, PAWN_AHEAD, PAWN_DIAGONALS,
+                        slider_attacks, squares_of)
+from .tablebase import (TABLE_DIR, TABLES, KING, PAWN, N_POSITIONS,
+                        index_of, table_path, save_table)
+
+KING_MASKS = STEP_MASKS[KING]
+KING_MOVES = [squares_of(mask) for mask in KING_MASKS]
+
+# squares a white pawn could have come from, to reach each square
+PAWN_FROM = [[sq_from for sq_from in range(56)
+              if sq_to in PAWN_AHEAD['white'][sq_from]]
+             for sq_to in range(64)]
+
+
+def piece_squares(kind):
+    """
+    Squares a white piece of kind can stand on
+    """
+    if kind == PAWN:
+        # no promotion, so it can reach the last rank but not leave it
+        return range(56)
+    return range(64)
+
+
+def piece_attacks(kind, square, occ):
+    if kind == PAWN:
+        return PAWN_DIAGONALS['white'][square]
+    return slider_attacks(square, kind, occ)
+
+
+def slider_moves(kind, square, occ):
+    """
+    Squares a slider of kind on square can move to, or have come from,
+    with the squares in occ occupied
+    """
+    return squares_of(slider_attacks(square, kind, occ) & ~occ)
+
+
+def generate(kind):
+    """
+    Return (white to move, black to move) bytearrays of table entries for
+    king and a white piece of kind against a black king
+    """
+    wtm = bytearray(N_POSITIONS)
+    btm = bytearray(N_POSITIONS)
+    # positions that are legal with white to move (black not in check)
+    wtm_legal = bytearray(N_POSITIONS)
+    # black moves not yet found to lose, for black to move positions
+    n_moves = bytearray(N_POSITIONS)
+
+    # positions decided at the current ply
+    lost = []
+
+    for white_king in range(64):
+        for piece in piece_squares(kind):
+            if piece == white_king:
+                continue
+            # without the black king, which doesn't block its own escape
+            occ = 1 << white_king | 1 << piece
+            attacked = (KING_MASKS[white_king]
+                        | piece_attacks(kind, piece, occ))
+            for black_king in range(64):
+                if (black_king == piece or black_king == white_king
+                    or KING_MASKS[white_king] >> black_king & 1):
+                    continue
+                i = index_of(white_king, piece, black_king)
+                in_check = attacked >> black_king & 1
+                wtm_legal[i] = not in_check
+
+                moves = 0
+                can_capture = False
+                for square in KING_MOVES[black_king]:
+                    if square == piece:
+                        if not KING_MASKS[white_king] >> piece & 1:
+                            can_capture = True
+                    elif not attacked >> square & 1:
+                        moves += 1
+
+                if can_capture:
+                    # leaves two kings, so never lost
+                    continue
+                n_moves[i] = moves
+                if not moves and in_check:
+                    btm[i] = 1
+                    lost.append((white_king, piece, black_king))
+
+    plies = 0
+    while lost:
+        won = []
+        # white moves into a lost position win
+        for white_king, piece, black_king in lost:
+            occ = 1 << white_king | 1 << piece | 1 << black_king
+            previous = []
+            for square in KING_MOVES[white_king]:
+                if (not occ >> square & 1
+                    and not KING_MASKS[square] >> black_king & 1):
+                    previous.append((square, piece, black_king))
+            moves_from = (PAWN_FROM[piece] if kind == PAWN
+                          else slider_moves(kind, piece, occ))
+            for square in moves_from:
+                if not occ >> square & 1:
+                    previous.append((white_king, square, black_king))
+
+            for position in previous:
+                i = index_of(*position)
+                if wtm_legal[i] and not wtm[i]:
+                    wtm[i] = plies + 2
+                    won.append(position)
+
+        lost = []
+        # black positions whose every move reaches a win are lost
+        for white_king, piece, black_king in won:
+            occ = 1 << white_king | 1 << piece
+            for square in KING_MOVES[black_king]:
+                if (occ >> square & 1
+                    or KING_MASKS[white_king] >> square & 1):
+                    continue
+                i = index_of(white_king, piece, square)
+                if btm[i] or not n_moves[i]:
+                    continue
+                n_moves[i] -= 1
+                if not n_moves[i]:
+                    btm[i] = plies + 3
+                    lost.append((white_king, piece, square))
+
+        plies += 2
+
+    return wtm, btm
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m magnanimus.retrograde',
+        description='Generate endgame tablebases')
+    parser.add_argument('tables', nargs='*',
+                        help=f'default all: {", ".join(TABLES)}')
+    parser.add_argument('--dir', default=str(TABLE_DIR))
+    args = parser.parse_args(argv)
+
+    unknown = set(args.tables) - set(TABLES)
+    if unknown:
+        parser.error(f'unknown tables {", ".join(sorted(unknown))}, use '
+                     f'some of {", ".join(TABLES)}')
+
+    for name in args.tables or TABLES:
+        start = time.perf_counter()
+        wtm, btm = generate(TABLES[name])
+        save_table(name, wtm, btm, args.dir)
+        wins = sum(1 for entry in wtm if entry)
+        longest = max(wtm) - 1 if wins else None
+        print(f'{name}: {wins} white to move wins, longest mate '
+              f'{longest} plies ({time.perf_counter() - start:.1f}s), saved '
+              f'to {table_path(name, args.dir)}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
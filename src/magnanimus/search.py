@@ -0,0 +1,278 @@
+"""
+Depth-first negamax search with alpha-beta pruning.
+
+Moves are made and taken back on the one position (Position.push / pop)
+rather than building a child Position per move.
+
+Alternative to the breadth-first search in get_best_move: memory is
+proportional to depth (one path of positions plus the principal
+variation), and scores are properly minimaxed rather than just sorting
+the leaves.
+
+Scores inside the search are from the point of view of the side to move
+(Position.score is always from white's point of view).
+"""
+
+import time
+
+from .constants import LOG
+from .scoring import CHECKMATE_SCORE, STALEMATE_SCORE
+from .Position import is_checked
+from .transposition import TranspositionTable, EXACT, LOWER, UPPER
+from .ordering import MoveOrderer
+from .tablebase import MAX_PIECES, probe_score
+
+INFINITY = float('inf')
+
+MAX_DEPTH = 64
+
+# scores beyond this are mates (CHECKMATE_SCORE less the ply it happens at)
+MATE_THRESHOLD = CHECKMATE_SCORE - 500
+
+
+class SearchAborted(Exception):
+    pass
+
+
+class SearchLimits():
+    """
+    When a search should stop: after time_sec, after max_nodes, or when
+    stop() is called (eg from another thread).  negamax calls count_node
+    for each node, which raises SearchAborted once a limit is hit.
+
+    Limits are only enforced once armed, so iterative_deepening can
+    always complete depth 1.
+    """
+    # nodes between clock checks
+    CHECK_EVERY = 64
+
+    def __init__(self, time_sec=None, max_nodes=None):
+        self.start = time.monotonic()
+        self.deadline = None if time_sec is None else self.start + time_sec
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.stopped = False
+        self.armed = True
+
+    def stop(self):
+        self.stopped = True
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def count_node(self):
+        self.nodes += 1
+        if not self.armed:
+            return
+        if self.stopped:
+            raise SearchAborted('stopped')
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchAborted('node limit')
+        if (self.deadline is not None and not self.nodes % self.CHECK_EVERY
+            and time.monotonic() > self.deadline):
+            raise SearchAborted('time limit')
+
+
+def iterative_deepening(position, max_depth=None, time_sec=None,
+                        max_nodes=None, table=None, limits=None,
+                        orderer=None, stats=None, on_depth=None):
+    """
+    Search to depth 1, 2, 3.. until max_depth, time_sec or max_nodes is
+    reached (or limits.stop() is called).  Returns (score, pv, depth) from
+    the last completed depth.
+
+    Earlier depths seed the transposition table with best moves to try
+    first, and the orderer's killer and history tables, so these are made
+    if not passed.
+
+    Pass a SearchStats to collect stats (see stats.py), and on_depth to
+    be called with (depth, score, pv, nodes, seconds) as each depth
+    completes
+    """
+    max_depth = max_depth or MAX_DEPTH
+    if table is None:
+        table = TranspositionTable(size_mb=1)
+    if orderer is None:
+        orderer = MoveOrderer()
+    if limits is None:
+        limits = SearchLimits(time_sec, max_nodes)
+
+    table.new_search()
+    stack_depth = len(position.undo_stack)
+    score, pv, completed = None, [], 0
+
+    for depth in range(1, max_depth + 1):
+        limits.armed = depth > 1
+        try:
+            score, pv = negamax(position, depth, -INFINITY, INFINITY,
+                                table=table, limits=limits, orderer=orderer,
+                                stats=stats)
+        except SearchAborted as err:
+            LOG.info(f'depth {depth} aborted: {err}')
+            break
+        finally:
+            # unwind the moves an aborted (or failed) search had pushed
+            while len(position.undo_stack) > stack_depth:
+                position.pop()
+
+        completed = depth
+        LOG.info(f'depth {depth}: {pv} score {score:.2f}, '
+                 f'{limits.nodes} nodes, {limits.elapsed:.2f}s')
+        if on_depth is not None:
+            on_depth(depth, score, pv, limits.nodes, limits.elapsed)
+
+        # no moves, or mate found: deeper won't change anything
+        if not pv or abs(score) > MATE_THRESHOLD:
+            break
+
+        # the next depth takes several times as long as this one, so
+        # don't start it if it cannot finish
+        if (limits.deadline is not None
+            and limits.elapsed > (limits.deadline - limits.start) / 2):
+            break
+
+    if stats is not None:
+        stats.table = table.counters
+        stats.ordering = orderer.counters
+
+    return score, pv, completed
+
+
+def negamax(position, depth, alpha, beta, ply=0, table=None, limits=None,
+            orderer=None, stats=None):
+    """
+    Return (score, pv) for position, searched to depth plies
+    """
+    if limits is not None:
+        limits.count_node()
+    if stats is not None:
+        stats.count_node(ply)
+
+    # exact from the tablebases (the root still needs a pv)
+    if ply and len(position.board) <= MAX_PIECES:
+        score = probe_score(position, ply)
+        if score is not None:
+            return score, []
+
+    if depth == 0:
+        return evaluate(position), []
+
+    alpha_orig = alpha
+    hash_move = None
+
+    if table is not None:
+        entry = table.probe(position.key)
+        if entry is not None:
+            entry_depth, bound, score, hash_move = entry
+            score = score_from_table(score, ply)
+            # the root needs a full pv, so always search it
+            if ply > 0 and entry_depth >= depth:
+                if (bound == EXACT
+                    or (bound == LOWER and score >= beta)
+                    or (bound == UPPER and score <= alpha)):
+                    return score, [hash_move] if hash_move else []
+
+    best_score = -INFINITY
+    best_pv = []
+    n_legal = 0
+
+    if stats is not None:
+        clock = time.perf_counter()
+    next_moves = position.legal_moves()
+    if stats is not None:
+        stats.times['movegen'] += time.perf_counter() - clock
+        stats.count_expansion(len(position.next_moves), len(next_moves))
+        clock = time.perf_counter()
+
+    if orderer is not None:
+        next_moves = orderer.order(position, next_moves, hash_move, ply)
+    # else just try the hash move first (if still there - keys can collide)
+    elif hash_move in next_moves:
+        next_moves = next_moves[:]
+        next_moves.remove(hash_move)
+        next_moves.insert(0, hash_move)
+
+    if stats is not None:
+        stats.times['sorting'] += time.perf_counter() - clock
+
+    for move in next_moves:
+        if stats is not None:
+            clock = time.perf_counter()
+            position.push(move)
+            stats.times['analysis'] += time.perf_counter() - clock
+        else:
+            position.push(move)
+        score, pv = negamax(position, depth - 1, -beta, -alpha, ply + 1,
+                            table, limits, orderer, stats)
+        score = -score
+        position.pop()
+        n_legal += 1
+
+        if score > best_score:
+            best_score = score
+            best_pv = [move] + pv
+
+        if score > alpha:
+            alpha = score
+
+        if alpha >= beta:
+            if orderer is not None:
+                orderer.cutoff(position, move, ply, depth, n_legal - 1,
+                               hash_move)
+            break
+
+    if not n_legal:
+        best_score = terminal_score(position, ply)
+
+    if table is not None:
+        if best_score <= alpha_orig:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        table.store(position.key, depth, bound,
+                    score_to_table(best_score, ply),
+                    best_pv[0] if best_pv else None)
+
+    return best_score, best_pv
+
+
+def evaluate(position):
+    """
+    Static score from the point of view of the side to move
+    """
+    if position.to_move == 'white':
+        return position.score
+    return -position.score
+
+
+def terminal_score(position, ply):
+    """
+    Score for a position with no legal moves: mate (preferring quicker
+    mates, hence the ply adjustment) or stalemate
+    """
+    checked = is_checked(position.board)
+    if checked is not None and position.to_move in checked:
+        return -(CHECKMATE_SCORE - ply)
+    return STALEMATE_SCORE
+
+
+def score_to_table(score, ply):
+    """
+    Mate scores are stored relative to the position, not the root
+    """
+    if score > MATE_THRESHOLD:
+        return score + ply
+    if score < -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score > MATE_THRESHOLD:
+        return score - ply
+    if score < -MATE_THRESHOLD:
+        return score + ply
+    return score
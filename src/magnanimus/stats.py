@@ -0,0 +1,117 @@
+"""
+Search statistics, for tuning the search from data.
+
+Pass a SearchStats to get_best_move (stats=...) and it is filled in as
+the search runs; leave it out and nothing is collected - every hook is
+behind an `if stats is not None`.
+
+    stats = SearchStats()
+    get_best_move(position, 3, stats=stats)
+    print(stats)
+
+Times are split into:
+    movegen   generating legal moves
+    analysis  making moves: building child positions, or push in the
+              alphabeta search (which includes re-analysing the board)
+    sorting   keeping the best positions (breadth) or ordering moves
+              (alphabeta)
+"""
+
+import time
+
+from .Position import CACHE_COUNTERS
+
+TIMERS = ['movegen', 'analysis', 'sorting']
+
+
+class SearchStats():
+    """
+    nodes_by_ply:    positions reached at each ply below the root
+    expanded:        positions whose moves were generated
+    illegal_moves:   pseudo-legal moves dropped by legal_moves (before
+                     legal move generation these were built as positions,
+                     then discarded for self-check)
+    times:           seconds by TIMERS
+    cache:           Position cache hits / misses during the search
+    table, ordering: transposition table and move ordering counters, if
+                     used
+    """
+    def __init__(self):
+        self.nodes_by_ply = []
+        self.expanded = 0
+        self.illegal_moves = 0
+        self.times = dict.fromkeys(TIMERS, 0.0)
+        self.cache = {}
+        self.table = None
+        self.ordering = None
+        self.seconds = 0.0
+        self.start_time = None
+        self.start_cache = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.start_cache = {name: dict(counts)
+                            for name, counts in CACHE_COUNTERS.items()}
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self.start_time
+        self.cache = {}
+        for name, counts in CACHE_COUNTERS.items():
+            hits = counts['hits'] - self.start_cache[name]['hits']
+            misses = counts['misses'] - self.start_cache[name]['misses']
+            self.cache[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0,
+            }
+
+    def count_node(self, ply, n=1):
+        nodes_by_ply = self.nodes_by_ply
+        while len(nodes_by_ply) <= ply:
+            nodes_by_ply.append(0)
+        nodes_by_ply[ply] += n
+
+    def count_expansion(self, n_pseudo, n_legal):
+        self.expanded += 1
+        self.illegal_moves += n_pseudo - n_legal
+
+    @property
+    def nodes(self):
+        return sum(self.nodes_by_ply)
+
+    @property
+    def branching_factor(self):
+        """
+        Mean positions reached per position expanded
+        """
+        below_root = self.nodes - (self.nodes_by_ply[0]
+                                   if self.nodes_by_ply else 0)
+        return below_root / self.expanded if self.expanded else 0
+
+    @property
+    def nodes_per_sec(self):
+        return self.nodes / self.seconds if self.seconds else 0
+
+    def summary(self):
+        return {
+            'nodes': self.nodes,
+            'nodes_by_ply': self.nodes_by_ply,
+            'expanded': self.expanded,
+            'illegal_moves': self.illegal_moves,
+            'branching_factor': self.branching_factor,
+            'seconds': self.seconds,
+            'nodes_per_sec': self.nodes_per_sec,
+            'times': self.times,
+            'cache': self.cache,
+            'table': self.table,
+            'ordering': self.ordering,
+        }
+
+    def __repr__(self):
+        pad = 18
+        out = []
+        for field, value in self.summary().items():
+            if isinstance(value, float):
+                value = f'{value:.3f}'
+            out.append(f'{field}:'.ljust(pad) + f'{value}')
+        return "\n".join(out)
@@ -0,0 +1,95 @@
+"""
+Precomputed tables, cached on disk so imports don't rebuild them.
+
+RAW_DOMAINS (domains.py) and the bitboard masks derived from it
+(bitboards.py) are built by walking every square in pure python, once:
+cached_tables keeps what a build function returns as a marshal file in
+DATA_DIR/tables, named by a checksum of the source files that build it,
+so any edit to those makes a fresh build.  Later imports (including each
+pool worker's) just load the file.
+
+Only plain containers of ints, strs, bools, lists, tuples and dicts can
+be cached (what marshal handles).
+
+The directory can be set with the MAGNANIMUS_TABLES_DIR environment
+variable (eg a temporary one under test), and set empty the tables are
+just built, in memory, each import.  If it can't be read or written (eg a
+read-only home) the same happens, so importing never fails for it.
+"""
+
+import marshal
+import os
+import zlib
+from pathlib import Path
+
+from .constants import DATA_DIR
+from .utils import atomic_write
+
+TABLES_DIR_VAR = 'MAGNANIMUS_TABLES_DIR'
+
+
+def tables_dir():
+    """
+    Return the cache directory, or None if caching is turned off
+    """
+    path = os.environ.get(TABLES_DIR_VAR)
+    if path is None:
+        return DATA_DIR / 'tables'
+    return Path(path) if path else None
+
+
+def source_checksum(sources):
+    """
+    Return a checksum of the files in sources (eg modules' __file__)
+    """
+    checksum = 0
+    for source in sources:
+        try:
+            with open(source, 'rb') as fp:
+                checksum = zlib.crc32(fp.read(), checksum)
+        except OSError:
+            # eg no source shipped: can't tell if stale, so don't cache
+            return None
+    return f'{checksum:08x}'
+
+
+def cached_tables(name, build, sources):
+    """
+    Return build(), loaded from tables_dir() if already cached for this
+    version of sources, or built and saved there if not.
+
+    If the cache is turned off, or can't be read or written, it is just
+    built
+    """
+    checksum = source_checksum(sources)
+    directory = tables_dir()
+    if checksum is None or directory is None:
+        return build()
+
+    path = directory / f'{name}_{checksum}.marshal'
+    try:
+        # loads from bytes - marshal.load reads a file in small pieces
+        with open(path, 'rb') as fp:
+            return marshal.loads(fp.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    tables = build()
+    try:
+        save_tables(tables, name, path)
+    except OSError:
+        pass
+    return tables
+
+
+def save_tables(tables, name, path):
+    """
+    Write tables to path (atomically - workers may be importing at the same
+    time), removing any left from earlier versions of name
+    """
+    with atomic_write(path) as fp:
+        marshal.dump(tables, fp)
+
+    for old_path in path.parent.glob(f'{name}_*.marshal'):
+        if old_path != path:
+            old_path.unlink(missing_ok=True)
@@ -0,0 +1,164 @@
+"""
+Endgame tablebases for king and one piece against a lone king (KQK, KRK
+and KPK), probed from memory-mapped files.  The tables are made offline
+by retrograde.py:
+
+    python -m magnanimus.retrograde             # generate all, in TABLE_DIR
+
+Each table is for the piece being white's, and is probed for either
+color by flipping the board (square ^ 56) and the colors.  A table is one
+byte per (white king, piece, black king) square, white to move first then
+black to move:
+
+    0     draw (or not a legal position)
+    n     white wins, with mate n - 1 plies from the position
+
+Only the side with the piece can mate, so that is all there is to store.
+The rules are this engine's: no promotion (so a pawn on the last rank is
+stuck, and KPK is all draws), and a pawn's double step is not blocked by
+a piece on the square it passes.  Castling rights are ignored.
+
+Two kings, and king and bishop or knight against a king, are draws
+without a table.
+"""
+
+import mmap
+from pathlib import Path
+
+from .constants import DATA_DIR, PIECE_INTS
+from .scoring import CHECKMATE_SCORE, STALEMATE_SCORE
+from .utils import atomic_write
+
+TABLE_DIR = DATA_DIR / 'tablebases'
+
+KING = PIECE_INTS['king']
+PAWN = PIECE_INTS['pawn']
+
+TABLES = {
+    'KQK': PIECE_INTS['queen'],
+    'KRK': PIECE_INTS['rook'],
+    'KPK': PAWN,
+}
+TABLE_NAMES = {kind: name for name, kind in TABLES.items()}
+
+# lone piece that can't mate
+DRAWN_KINDS = {PIECE_INTS['bishop'], PIECE_INTS['knight']}
+
+MAX_PIECES = 3
+
+N_POSITIONS = 64 * 64 * 64
+
+# probe results, for the side to move
+WIN, DRAW, LOSS = 1, 0, -1
+
+# opened on first probe, None if not generated
+LOADED = {}
+
+
+def index_of(white_king, piece, black_king):
+    return (white_king * 64 + piece) * 64 + black_king
+
+
+def table_path(name, table_dir=TABLE_DIR):
+    return Path(table_dir) / f'{name}.bin'
+
+
+def save_table(name, wtm, btm, table_dir=TABLE_DIR):
+    with atomic_write(table_path(name, table_dir)) as fp:
+        fp.write(wtm)
+        fp.write(btm)
+
+
+def load_table(name, table_dir=TABLE_DIR):
+    """
+    Return the table name memory-mapped, or None if not generated
+    """
+    key = (name, str(table_dir))
+    if key not in LOADED:
+        path = table_path(name, table_dir)
+        if path.exists():
+            with open(path, 'rb') as fp:
+                LOADED[key] = mmap.mmap(fp.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+        else:
+            LOADED[key] = None
+    return LOADED[key]
+
+
+def probe(position, table_dir=TABLE_DIR):
+    """
+    Return (WIN / DRAW / LOSS for the side to move, plies to mate or None
+    if drawn), or None if the position is not in the tablebases: not just
+    a king each and at most one other piece
+    """
+    board = position.board
+    if len(board) > MAX_PIECES:
+        return None
+
+    # only boards with both kings (test seeds often leave them out)
+    white_king = board.king_square('white')
+    black_king = board.king_square('black')
+    if white_king is None or black_king is None:
+        return None
+    if len(board) == 2:
+        return DRAW, None
+
+    strong = 'white' if len(board.pieces['white']) == 2 else 'black'
+    squares = board.squares
+    piece = next(sq for sq in board.pieces[strong]
+                 if abs(squares[sq]) != KING)
+    kind = abs(squares[piece])
+    if kind in DRAWN_KINDS:
+        return DRAW, None
+
+    table = load_table(TABLE_NAMES[kind], table_dir)
+    if table is None:
+        return None
+
+    if strong == 'black':
+        white_king, piece, black_king = (black_king ^ 56, piece ^ 56,
+                                         white_king ^ 56)
+
+    strong_to_move = position.to_move == strong
+    i = index_of(white_king, piece, black_king)
+    entry = table[i if strong_to_move else N_POSITIONS + i]
+
+    if not entry:
+        return DRAW, None
+    return (WIN if strong_to_move else LOSS), entry - 1
+
+
+def probe_score(position, ply=0, table_dir=TABLE_DIR):
+    """
+    Search score of position from the tablebases, for the side to move
+    with mates ply-adjusted as in the search - or None if not in them
+    """
+    result = probe(position, table_dir)
+    if result is None:
+        return None
+    outcome, plies = result
+    if outcome == DRAW:
+        return STALEMATE_SCORE
+    return outcome * (CHECKMATE_SCORE - ply - plies)
+
+
+def best_move(position, table_dir=TABLE_DIR):
+    """
+    Return the best move of position from the tablebases: the quickest
+    mate if winning, the slowest if losing, else one keeping the draw.
+    None if not in the tablebases, or no legal moves
+    """
+    if probe(position, table_dir) is None:
+        return None
+
+    best = None
+    best_score = None
+    for move in position.legal_moves() or []:
+        position.push(move)
+        score = -probe_score(position, 1, table_dir)
+        position.pop()
+        if best_score is None or score > best_score:
+            best = move
+            best_score = score
+
+    return best
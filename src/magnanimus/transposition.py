@@ -0,0 +1,245 @@
+"""
+Fixed-size transposition table, keyed by Position.key (zobrist.py).
+
+Each entry is two 64-bit words: the key XORed with the data, and the
+data.  Data packs:
+
+    bits  0-7   to square of best move
+    bits  8-15  from square of best move (NO_MOVE if none)
+    bits 16-17  bound type (EXACT, LOWER, UPPER)
+    bits 18-23  generation (search number, mod 64)
+    bits 24-31  depth
+    bits 32-63  score * SCORE_SCALE, offset to be unsigned
+
+Storing key ^ data means a torn or colliding entry fails the key check
+rather than returning someone else's data.
+
+SharedTranspositionTable keeps the words in shared memory instead, for
+search processes to share.  There are no locks: the two words of an
+entry are written separately, and a read racing a write fails the key
+check like any other miss.
+
+Entries live in buckets of two:
+    slot 0 - depth-preferred: replaced only by a deeper (or equal) search,
+             or if it is from an earlier search
+    slot 1 - always replaced (and takes what slot 0 evicts)
+"""
+import os
+from array import array
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+ENTRY_BYTES = 16
+BUCKET_ENTRIES = 2
+
+SCORE_SCALE = 10000
+SCORE_OFFSET = 1 << 31
+
+NO_MOVE = 255
+
+MASK_64 = (1 << 64) - 1
+
+
+def pack(depth, bound, score, move, generation):
+    if move is None:
+        sq_from, sq_to = NO_MOVE, 0
+    else:
+        sq_from, sq_to = move
+    score = round(score * SCORE_SCALE) + SCORE_OFFSET
+    return (sq_to
+            | sq_from << 8
+            | bound << 16
+            | (generation & 63) << 18
+            | depth << 24
+            | score << 32)
+
+
+def unpack(data):
+    """
+    Return depth, bound, score, move
+    """
+    sq_from = data >> 8 & 255
+    move = None if sq_from == NO_MOVE else (sq_from, data & 255)
+    score = ((data >> 32) - SCORE_OFFSET) / SCORE_SCALE
+    return data >> 24 & 255, data >> 16 & 3, score, move
+
+
+class TranspositionTable():
+    """
+    Bounded memory table of search results.  Make one and pass it to
+    successive searches (Game does) so each reuses earlier work.
+    """
+    def __init__(self, size_mb=16):
+        self.size_mb = size_mb
+        self.n_buckets = max(1, int(size_mb * 2**20)
+                                // (ENTRY_BYTES * BUCKET_ENTRIES))
+        self.words = self.make_words(self.n_buckets * BUCKET_ENTRIES * 2)
+        self.generation = 0
+        self.reset_counters()
+
+    def make_words(self, n_words):
+        return array('Q', bytes(8 * n_words))
+
+    def reset_counters(self):
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0 # probed bucket full of other positions
+        self.stores = 0
+        self.overwrites = 0 # stores evicting a different position
+
+    @property
+    def counters(self):
+        return {
+            'probes': self.probes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+            'hit_rate': self.hits / self.probes if self.probes else 0,
+        }
+
+    def new_search(self):
+        """
+        Call at the start of each search, so entries from earlier ones
+        give way in the depth-preferred slot
+        """
+        self.generation = (self.generation + 1) & 63
+
+    def clear(self):
+        self.words = self.make_words(len(self.words))
+        self.reset_counters()
+
+    def slot_index(self, key, slot):
+        """
+        Index into words of the check word of the slot
+        """
+        return ((key % self.n_buckets) * BUCKET_ENTRIES + slot) * 2
+
+    def probe(self, key):
+        """
+        Return (depth, bound, score, move) for the key, or None
+        """
+        self.probes += 1
+        words = self.words
+        occupied = 0
+        for slot in range(BUCKET_ENTRIES):
+            i = self.slot_index(key, slot)
+            check, data = words[i], words[i + 1]
+            if check ^ data == key:
+                self.hits += 1
+                return unpack(data)
+            occupied += data != 0
+
+        self.misses += 1
+        if occupied == BUCKET_ENTRIES:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, bound, score, move=None):
+        key &= MASK_64
+        words = self.words
+        data = pack(depth, bound, score, move, self.generation)
+        self.stores += 1
+
+        i = self.slot_index(key, 0)
+        check, old = words[i], words[i + 1]
+        old_key = check ^ old
+
+        if (old_key == key or not old
+            or depth >= old >> 24 & 255
+            or (old >> 18 & 63) != self.generation):
+            # demote the previous occupant to the always-replace slot
+            if old and old_key != key:
+                j = self.slot_index(key, 1)
+                if words[j + 1]:
+                    self.overwrites += 1
+                words[j], words[j + 1] = check, old
+        else:
+            i = self.slot_index(key, 1)
+            if words[i + 1] and words[i] ^ words[i + 1] != key:
+                self.overwrites += 1
+
+        words[i], words[i + 1] = key ^ data, data
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    TranspositionTable in shared memory, for any number of processes on
+    one machine to probe and store in without locks.
+
+    Pickles as the shared memory name, so can be passed to worker
+    processes, which attach to the same memory.  The process that made it
+    owns the memory, and should call close() when done with it (keeping
+    it between searches, eg across Game.next() calls, is the point).
+    Counters are per process.
+    """
+    def __init__(self, size_mb=16, name=None):
+        self.name = name
+        self.shm = None
+        super().__init__(size_mb)
+
+    def make_words(self, n_words):
+        from multiprocessing import shared_memory
+
+        if self.name is None:
+            self.shm = shared_memory.SharedMemory(create=True,
+                                                  size=8 * n_words)
+            self.name = self.shm.name
+            # a forked child has a copy of this object, but is not the owner
+            self.owner = os.getpid()
+        else:
+            self.shm = attach(self.name)
+            self.owner = None
+        # the size may be rounded up to whole pages
+        return self.shm.buf[:8 * n_words].cast('Q')
+
+    def clear(self):
+        self.shm.buf[:len(self.words) * 8] = bytes(len(self.words) * 8)
+        self.reset_counters()
+
+    def close(self):
+        """
+        Detach, and free the memory if this is the owner
+        """
+        if self.shm is None:
+            return
+        self.words.release()
+        self.shm.close()
+        if self.owner == os.getpid():
+            self.shm.unlink()
+        self.shm = None
+
+    def __del__(self):
+        self.close()
+
+    def __getstate__(self):
+        return {'size_mb': self.size_mb, 'name': self.name,
+                'generation': self.generation}
+
+    def __setstate__(self, state):
+        self.__init__(state['size_mb'], state['name'])
+        self.generation = state['generation']
+
+
+def attach(name):
+    """
+    Attach to existing shared memory, without the resource tracker
+    unlinking it when this process exits (the owner does that)
+    """
+    from multiprocessing import shared_memory, resource_tracker
+
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        pass
+
+    # python < 3.13 has no track argument, and registers attached memory
+    # with the tracker too - so skip that
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
@@ -0,0 +1,347 @@
+"""
+UCI front end, for driving magnanimus from chess GUIs and tournament
+managers:
+
+    python -m magnanimus        (or the magnanimus console script)
+
+Supports uci, isready, ucinewgame, setoption (Hash, OwnBook), position
+(startpos or fen, then moves), go (wtime, btime, winc, binc, movestogo,
+movetime, depth, nodes, infinite), stop and quit.  A go with none of
+those limits searches for DEFAULT_MOVE_SEC (rather than till stopped, as
+for infinite).  Bad or unknown input is logged and ignored.
+
+Commands are read on the main thread while a search runs on another, so
+stop (or quit) aborts it at once, through its SearchLimits.  The search
+reports an info line per depth completed, then its bestmove.
+
+Moves are in UCI's coordinate notation, with castling as the king's move
+(e1g1) - the engine's castling moves are the rook's, from square + 100.
+The engine has no promotion or en passant, so those moves are refused,
+and a FEN's en passant square is ignored.
+"""
+
+import sys
+import threading
+
+from .constants import (LOG, INIT_BOARD_TUPLES, CASTLING_ROOK_MOVES,
+                        CASTLING_SQUARES, REV_PIECE_CODES)
+from .notation import int_to_trad
+from .Position import Position
+from .search import (iterative_deepening, SearchLimits, MATE_THRESHOLD,
+                     MAX_DEPTH)
+from .scoring import CHECKMATE_SCORE
+from .transposition import TranspositionTable
+from .ordering import MoveOrderer
+from .book import BOOK_PATH, open_book
+from . import tablebase
+
+ENGINE_NAME = 'magnanimus'
+ENGINE_AUTHOR = 'opi9a'
+
+DEFAULT_HASH_MB = 16
+
+# moves assumed left in the game when the GUI doesn't say
+MOVES_TO_GO = 30
+# of the clock, kept back for overheads
+SAFETY_SEC = 0.05
+# for a go with no limits
+DEFAULT_MOVE_SEC = 5
+
+# engine castling move (the rook's) to the king's move, as UCI has it
+CASTLING_KING_MOVES = {
+    CASTLING_ROOK_MOVES[color][side]: (
+        CASTLING_SQUARES[color][side][0],
+        CASTLING_SQUARES[color][side][0] + (2 if side == 'k' else -2))
+    for color in ['white', 'black'] for side in ['k', 'q']
+}
+
+
+def move_to_uci(move):
+    if move in CASTLING_KING_MOVES:
+        move = CASTLING_KING_MOVES[move]
+    return int_to_trad(move[0]) + int_to_trad(move[1])
+
+
+def uci_to_move(position, text):
+    """
+    Return the legal move of position written text, or None
+    """
+    for move in position.legal_moves() or []:
+        if move_to_uci(move) == text:
+            return move
+    return None
+
+
+def position_from_fen(fen):
+    """
+    Position from a FEN string (en passant square and move counts ignored)
+    """
+    fields = fen.split()
+    if len(fields) < 2:
+        raise ValueError(f'bad fen {fen!r}')
+    placement, active = fields[:2]
+    castling = fields[2] if len(fields) > 2 else '-'
+
+    seed = []
+    rows = placement.split('/')
+    if len(rows) != 8:
+        raise ValueError(f'bad fen {fen!r}: need 8 rows')
+    for row, row_text in enumerate(rows):
+        col = 0
+        for char in row_text:
+            if char.isdigit():
+                col += int(char)
+                continue
+            if char.lower() not in REV_PIECE_CODES or col > 7:
+                raise ValueError(f'bad fen {fen!r}: at {char!r}')
+            color = 'white' if char.isupper() else 'black'
+            seed.append((REV_PIECE_CODES[char.lower()], color, row * 8 + col))
+            col += 1
+
+    legal_castlings = {
+        'white': [side.lower() for side in 'KQ' if side in castling],
+        'black': [side for side in 'kq' if side in castling],
+    }
+    to_move = 'white' if active == 'w' else 'black'
+
+    return Position(init_seed=seed, to_move=to_move,
+                    legal_castlings=legal_castlings)
+
+
+def parse_go(tokens):
+    """
+    Return {name: value} for the go command's tokens (after 'go')
+    """
+    out = {}
+    i = 0
+    while i < len(tokens):
+        name = tokens[i]
+        if name in ('infinite', 'ponder'):
+            out[name] = True
+            i += 1
+        elif name == 'searchmoves':
+            # the rest are moves
+            out[name] = tokens[i + 1:]
+            break
+        else:
+            try:
+                out[name] = int(tokens[i + 1])
+            except (IndexError, ValueError):
+                pass
+            i += 2
+    return out
+
+
+def time_for_move(go, to_move):
+    """
+    Seconds to search, from go's parameters, or None for no time limit
+    (when the depth, nodes or infinite is the limit)
+    """
+    if 'movetime' in go:
+        return max(go['movetime'] / 1000 - SAFETY_SEC, 0.01)
+
+    prefix = 'w' if to_move == 'white' else 'b'
+    if f'{prefix}time' not in go:
+        if any(name in go for name in ('depth', 'nodes', 'infinite')):
+            return None
+        return DEFAULT_MOVE_SEC
+
+    remaining = go[f'{prefix}time'] / 1000
+    increment = go.get(f'{prefix}inc', 0) / 1000
+    moves_to_go = go.get('movestogo', MOVES_TO_GO)
+    budget = remaining / max(moves_to_go, 1) + increment * 0.8
+    return max(min(budget, remaining / 2 - SAFETY_SEC), 0.01)
+
+
+def uci_score(score):
+    """
+    'cp n' or 'mate n' (in moves, negative if being mated)
+    """
+    if abs(score) > MATE_THRESHOLD:
+        plies = CHECKMATE_SCORE - abs(score)
+        moves = (plies + 1) // 2
+        return f'mate {moves if score > 0 else -moves}'
+    return f'cp {round(score * 100)}'
+
+
+class UciEngine():
+    """
+    The UCI session state.  handle() runs one command line, and returns
+    False on quit
+    """
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.out_lock = threading.Lock()
+        self.position = Position(init_seed=INIT_BOARD_TUPLES,
+                                 to_move='white')
+        self.hash_mb = DEFAULT_HASH_MB
+        self.table = TranspositionTable(self.hash_mb)
+        self.use_book = True
+        self.book = open_book(BOOK_PATH)
+        self.limits = None
+        self.thread = None
+        # set by stop, for an infinite search that finished early
+        self.stop_event = threading.Event()
+
+    def send(self, line):
+        with self.out_lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        LOG.info(f'uci: {line.strip()}')
+
+        if command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_AUTHOR}')
+            self.send(f'option name Hash type spin default {DEFAULT_HASH_MB} '
+                      f'min 1 max 1024')
+            self.send('option name OwnBook type check default true')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'ucinewgame':
+            self.stop()
+            self.table = TranspositionTable(self.hash_mb)
+        elif command == 'setoption':
+            self.stop()
+            self.set_option(args)
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(parse_go(args))
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            self.stop()
+            return False
+        else:
+            LOG.info(f'uci: unknown command {command}')
+
+        return True
+
+    def set_option(self, args):
+        # name <name> [value <value>], either of which may have spaces
+        split = args.index('value') if 'value' in args else len(args)
+        name = ' '.join(args[1:split] if args[:1] == ['name']
+                        else args[:split]).lower()
+        value = ' '.join(args[split + 1:])
+        if name == 'hash':
+            try:
+                self.hash_mb = max(1, int(value))
+            except ValueError:
+                LOG.info(f'uci: bad Hash value {value!r}')
+                self.send(f'info string bad Hash value {value!r}')
+                return
+            self.table = TranspositionTable(self.hash_mb)
+        elif name == 'ownbook':
+            self.use_book = value.lower() == 'true'
+        else:
+            LOG.info(f'uci: unknown option {name}')
+
+    def set_position(self, args):
+        if 'moves' in args:
+            split = args.index('moves')
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+
+        try:
+            if setup and setup[0] == 'fen':
+                position = position_from_fen(' '.join(setup[1:]))
+            else:
+                position = Position(init_seed=INIT_BOARD_TUPLES,
+                                    to_move='white')
+        except ValueError as err:
+            self.send(f'info string {err}')
+            return
+
+        for text in moves:
+            move = uci_to_move(position, text)
+            if move is None:
+                self.send(f'info string illegal move {text}, ignoring the '
+                          f'rest')
+                break
+            position.push(move)
+
+        self.position = position
+
+    def go(self, go):
+        """
+        Start searching self.position in a thread, which sends the bestmove
+        """
+        position = self.position
+
+        # book and tablebase moves need no search - unless told to keep
+        # going till stopped
+        if not go.get('infinite'):
+            move = None
+            if self.use_book and self.book:
+                move = self.book.move(position)
+            if move is None:
+                move = tablebase.best_move(position)
+            if move is not None:
+                self.send(f'bestmove {move_to_uci(move)}')
+                return
+
+        self.limits = SearchLimits(time_for_move(go, position.to_move),
+                                   go.get('nodes'))
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self.search,
+            args=(position.detached(), go.get('depth', MAX_DEPTH),
+                  self.limits, go.get('infinite', False)),
+            daemon=True)
+        self.thread.start()
+
+    def search(self, position, max_depth, limits, infinite):
+
+        def on_depth(depth, score, pv, nodes, seconds):
+            ms = int(seconds * 1000)
+            nps = int(nodes / seconds) if seconds else 0
+            self.send(f'info depth {depth} score {uci_score(score)} '
+                      f'nodes {nodes} nps {nps} time {ms} '
+                      f'pv {" ".join(move_to_uci(move) for move in pv)}')
+
+        _, pv, _ = iterative_deepening(
+            position, max_depth, table=self.table, limits=limits,
+            orderer=MoveOrderer(), on_depth=on_depth)
+
+        # in infinite mode the bestmove waits for stop
+        if infinite:
+            self.stop_event.wait()
+
+        self.send(f'bestmove {move_to_uci(pv[0]) if pv else "0000"}')
+
+    def stop(self):
+        """
+        Stop any search, and wait for it to send its bestmove
+        """
+        if self.thread is None:
+            return
+        self.limits.stop()
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+
+def main(stdin=None, stdout=None):
+    stdin = stdin or sys.stdin
+    engine = UciEngine(stdout)
+    while True:
+        line = stdin.readline()
+        # end of input is a quit
+        if not line or not engine.handle(line):
+            engine.stop()
+            break
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,6 +1,6 @@
-from termcolor import cprint
-import pandas as pd
-import numpy as np
+import os
+from contextlib import contextmanager
+from pathlib import Path
 
 from .constants import REV_PIECE_CODES, INIT_BOARD_TUPLES
 from .notation import trad_to_int
@@ -10,6 +10,8 @@ def make_board_df(piece_seed=None):
     """
     Make an empty board df (no analysis)
     """
+    import pandas as pd
+
     if isinstance(piece_seed, str):
         piece_tuples = piece_tuples_from_str(piece_seed)
 
@@ -34,6 +36,25 @@ def make_board_df(piece_seed=None):
 
 
 
+@contextmanager
+def atomic_write(path):
+    """
+    Open path for writing in binary, via a temporary file (named by pid)
+    that replaces it on closing - so readers, including other processes
+    with it open or mapped, only ever see a whole file.  Makes the parent
+    directory if needed
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp_path, 'wb') as fp:
+            yield fp
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
 def invert_color(color):
     if color == 'black':
         return 'white'
@@ -0,0 +1,58 @@
+"""
+Zobrist hashing: a 64-bit key per position, made by XORing a random
+number for each (piece, square), one for black to move, and one for each
+castling right held.
+
+Tables come from a fixed seed so keys are the same in every process (and
+so can be saved, eg in json or an opening book).  Keys are updated
+incrementally as moves are made: see Position.__init__.
+"""
+import random
+
+ZOBRIST_SEED = 20200101
+
+_rng = random.Random(ZOBRIST_SEED)
+
+# indexed by piece code + 6 (as Board.masks), then square
+PIECE_KEYS = [[_rng.getrandbits(64) for sq in range(64)] for code in range(13)]
+
+BLACK_TO_MOVE_KEY = _rng.getrandbits(64)
+
+CASTLING_KEYS = {
+    color: {side: _rng.getrandbits(64) for side in ['k', 'q']}
+    for color in ['white', 'black']
+}
+
+
+def position_key(board, to_move, legal_castlings):
+    """
+    Compute the key from scratch
+    """
+    key = 0
+    for square in board:
+        key ^= PIECE_KEYS[board.squares[square] + 6][square]
+
+    if to_move == 'black':
+        key ^= BLACK_TO_MOVE_KEY
+
+    return key ^ castling_key(legal_castlings)
+
+
+def castling_key(legal_castlings):
+    key = 0
+    for color, sides in legal_castlings.items():
+        for side in sides:
+            key ^= CASTLING_KEYS[color][side]
+    return key
+
+
+def move_key(code, sq_from, sq_to, captured=0):
+    """
+    Return the XOR delta for moving piece code from sq_from to sq_to,
+    taking captured (code, 0 if none)
+    """
+    piece_keys = PIECE_KEYS[code + 6]
+    key = piece_keys[sq_from] ^ piece_keys[sq_to]
+    if captured:
+        key ^= PIECE_KEYS[captured + 6][sq_to]
+    return key